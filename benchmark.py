@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Checks that the SVG engines of pychess_svg produce equivalent documents and compares their speed"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+
+import pychess
+import pychess_svg
+
+
+THEME = os.path.join(os.path.dirname(__file__), "lichess-brown.json")
+
+# (name, board fen, rows, keyword arguments for pychess_svg.board)
+POSITIONS = [
+    ("chess", "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR", {
+        "lastmove": "e2e4",
+    }),
+    ("chess markup", "r1bqkb1r/pppp1Qpp/2n2n2/4p3/2B1P3/8/PPPP1PPP/RNB1K1NR", {
+        "flipped": True,
+        "check": "e8",
+        "arrows": ["Gc4f7", "Rh5f7", "Be8"],
+        "squares": ["a3", "c3"],
+        "coordinates": "standard",
+    }),
+    ("xiangqi", "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR", {
+        "coordinates": "janggi",
+        "rotate_opponent": True,
+    }),
+    ("shogi", "lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL", {
+        "coordinates": "shogi",
+        "lastmove": "c3c4",
+    }),
+    ("large", "rnbqkbnrqr/pppppppppp/4p5/9p/p9/5P4/P9/9P/PPPPPPPPPP/RNBQKBNRQR", {
+        "coordinates": "standard",
+        "arrows": ["Ga1j8"],
+    }),
+]
+
+
+def canonical(svg):
+    """Reduces an SVG document to a comparable structure."""
+    def walk(element):
+        return (element.tag, element.attrib, (element.text or "").strip(), [walk(child) for child in element])
+    return walk(ET.fromstring(svg))
+
+
+def render(css, fen, kwargs, engine):
+    kwargs = dict(kwargs)
+    if "lastmove" in kwargs:
+        kwargs["lastmove"] = pychess.Move.from_uci(kwargs["lastmove"])
+    if "arrows" in kwargs:
+        kwargs["arrows"] = [pychess.Arrow.from_pgn(arrow) for arrow in kwargs["arrows"]]
+    return pychess_svg.board(css, pychess.Board(fen, css), engine=engine, **kwargs)
+
+
+def main(args):
+    with open(THEME) as f:
+        colors = json.load(f)
+
+    ok = True
+    for name, fen, kwargs in POSITIONS:
+        kwargs = dict(kwargs, colors=colors, width=args.size, height=args.size)
+        documents = {engine: render(args.css, fen, kwargs, engine) for engine in pychess_svg.ENGINES}
+        reference = canonical(documents["etree"])
+        for engine, svg in documents.items():
+            if canonical(svg) != reference:
+                print(f"{name}: {engine} differs from etree")
+                ok = False
+
+        timings = []
+        for engine in pychess_svg.ENGINES:
+            seconds = min(timeit.repeat(lambda: render(args.css, fen, kwargs, engine), number=args.number, repeat=3))
+            timings.append(f"{engine} {seconds / args.number * 1e6:.0f} us ({len(documents[engine])} bytes)")
+        print(f"{name}: " + ", ".join(timings))
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--css", default="standard/standard", help="piece set (default: standard/standard)")
+    parser.add_argument("--size", type=int, default=360, help="image size (default: 360)")
+    parser.add_argument("--number", "-n", type=int, default=200, help="renders per timing (default: 200)")
+    sys.exit(main(parser.parse_args()))
@@ -1,182 +1,422 @@
-import string
-from pychess_svg import get_svg_pieces_from_css, read_piece_svg, SVG_PIECES
-
-COLORS = [WHITE, BLACK] = [True, False]
-COLOR_NAMES = ["black", "white"]
-
-PIECE_TYPES = range(len(string.ascii_lowercase))
-PIECE_LETTERS = string.ascii_lowercase
-
-
-def default_file_label(index, cols, orientation):
-    # Standard: a-h, i.e., 0 -> 'a', 1 -> 'b', ...
-    if orientation:
-        return chr(ord('a') + index)
-    else:
-        return chr(ord('a') + (cols - index - 1))
-
-COORDS = {
-    "standard": (lambda i, n: chr(ord('a') + i), lambda i, n: str(n - i)),
-    "shogi": (lambda i, n: str(n - i), lambda i, n: str(i + 1)),
-    "janggi": (lambda i, n: str(i + 1), lambda i, n: str((i + 1) % 10)),
-}
-
-
-class Arrow:
-    def __init__(self, tail, head, color="green"):
-        self.tail = tail
-        self.head = head
-        self.color = color
-
-    @classmethod
-    def from_pgn(cls, pgn):
-        if pgn.startswith("G"):
-            color = "green"
-            pgn = pgn[1:]
-        elif pgn.startswith("R"):
-            color = "red"
-            pgn = pgn[1:]
-        elif pgn.startswith("Y"):
-            color = "yellow"
-            pgn = pgn[1:]
-        elif pgn.startswith("B"):
-            color = "blue"
-            pgn = pgn[1:]
-        elif pgn.startswith("W"):
-            color = "white"
-            pgn = pgn[1:]
-        elif pgn.startswith("K"):
-            color = "black"
-            pgn = pgn[1:]
-        else:
-            color = "green"
-
-        if len(pgn) > 2 and pgn[2].isdigit():
-            # rank > 9
-            tail = pgn[:3]
-            head = pgn[3:] if len(pgn) > 3 else tail
-        else:
-            tail = pgn[:2]
-            head = pgn[2:] if len(pgn) > 2 else tail
-        return cls(tail, head, color=color)
-
-    def __repr__(self):
-        return "%s%s%s" % (self.color[0].upper(), self.head, self.tail)
-
-
-class Piece:
-    def __init__(self, piece_type, color):
-        self.piece_type = piece_type
-        self.color = color
-        self.promoted = False
-
-    @property
-    def symbol(self):
-        promoted = "p" if self.promoted else ""
-        if self.color == WHITE:
-            return promoted + PIECE_LETTERS[self.piece_type].upper()
-        else:
-            return promoted + PIECE_LETTERS[self.piece_type]
-
-    @classmethod
-    def from_letter(cls, letter):
-        if letter.islower():
-            return cls(PIECE_LETTERS.index(letter), BLACK)
-        else:
-            return cls(PIECE_LETTERS.index(letter.lower()), WHITE)
-
-    def __repr__(self):
-        return self.symbol
-
-    def __str__(self):
-        return self.symbol
-
-
-class Move:
-    def __init__(self, from_square, to_square, promotion=None, drop=None):
-        self.from_square = from_square
-        self.to_square = to_square
-        self.promotion = promotion
-        self.drop = drop
-
-    @classmethod
-    def from_uci(cls, uci):
-        if "@" == uci[1]:
-            drop = PIECE_LETTERS.index(uci[0].lower())
-            square = uci[2:]
-            return cls(square, square, drop=drop)
-        elif 4 <= len(uci) <= 5:
-            if uci[-1].islower():
-                promotion = PIECE_LETTERS.index(uci[-1])
-                uci = uci[:-1]
-            else:
-                promotion = None
-
-            if uci[2].isdigit():
-                from_square = uci[0:3]
-                to_square = uci[3:]
-            else:
-                from_square = uci[0:2]
-                to_square = uci[2:]
-            return cls(from_square, to_square, promotion=promotion)
-
-
-class Board:
-    def __init__(self, board_fen, css, rows=8, cols=8):
-        self.pieces = {}
-        self.rows = rows
-        self.cols = cols
-        if board_fen is None:
-            self.clear_board()
-        else:
-            self.set_board_fen(css, board_fen)
-
-    def contains_piece(self, piece_type, color):
-        for piece in self.pieces.values():
-            if piece.piece_type == piece_type and piece.color == color:
-                return True
-        return False
-
-    def piece_at(self, row, col):
-        return self.pieces.get((row, col))
-
-    def set_board_fen(self, css, fen):
-        if css not in SVG_PIECES:
-            get_svg_pieces_from_css(css)
-
-        fen = fen.split()[0].strip()  # Ignore any additional FEN parts
-        rows = fen.split("/")
-
-        # Clear the board.
-        self.pieces = {}
-
-        # Put pieces on the board.
-        for row_index, row in enumerate(rows):
-            col_index = 0
-            promoted_plus = False
-            for c in row:
-                try:
-                    col_index += int(c)
-                except ValueError:
-                    if c not in "~+":
-                        piece = Piece.from_letter(c)
-                        if promoted_plus:
-                            piece.promoted = True
-                            promoted_plus = False
-
-                        self.pieces[(row_index, col_index)] = piece
-                        col_index += 1
-
-                        # Read piece SVG
-                        if piece.symbol not in SVG_PIECES[css]:
-                            read_piece_svg(css, piece)
-                    else:
-                        if c == "~":
-                            piece.promoted = True
-                            if piece.symbol not in SVG_PIECES[css]:
-                                read_piece_svg(css, piece)
-                        if c == "+":
-                            promoted_plus = True
-
-        self.rows = len(rows)
-        self.cols = col_index
+import functools
+import hashlib
+import string
+from pychess_svg import expire_missing, get_svg_pieces_from_css, read_piece_svg, SVG_PIECES
+
+COLORS = [WHITE, BLACK] = [True, False]
+COLOR_NAMES = ["black", "white"]
+
+PIECE_TYPES = range(len(string.ascii_lowercase))
+PIECE_LETTERS = string.ascii_lowercase
+
+KING = PIECE_LETTERS.index("k")
+ROOK = PIECE_LETTERS.index("r")
+PAWN = PIECE_LETTERS.index("p")
+
+# The largest boards accepted from FENs. Files are named a to z.
+MAX_ROWS = 16
+MAX_COLS = 26
+
+
+@functools.lru_cache(maxsize=(MAX_ROWS + 1) * (MAX_COLS + 1) * 4 * len(PIECE_LETTERS))
+def zobrist_key(row, col, symbol):
+    """
+    Returns the 64 bit Zobrist key of a piece on a square. Keys are derived
+    from their arguments, so that hashes agree between processes. The cache
+    holds the keys of all pieces on boards up to :data:`MAX_ROWS` x
+    :data:`MAX_COLS`.
+    """
+    digest = hashlib.blake2b(("%d,%d,%s" % (row, col, symbol)).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+ZOBRIST_BLACK = zobrist_key(-1, -1, "black")
+
+
+def default_file_label(index, cols, orientation):
+    # Standard: a-h, i.e., 0 -> 'a', 1 -> 'b', ...
+    if orientation:
+        return chr(ord('a') + index)
+    else:
+        return chr(ord('a') + (cols - index - 1))
+
+COORDS = {
+    "standard": (lambda i, n: chr(ord('a') + i), lambda i, n: str(n - i)),
+    "shogi": (lambda i, n: str(n - i), lambda i, n: str(i + 1)),
+    "janggi": (lambda i, n: str(i + 1), lambda i, n: str((i + 1) % 10)),
+}
+
+ARROW_COLOR_PREFIXES = {
+    "green": "G",
+    "red": "R",
+    "yellow": "Y",
+    "blue": "B",
+    "white": "W",
+    "black": "K",
+}
+
+
+class Arrow:
+    def __init__(self, tail, head, color="green"):
+        self.tail = tail
+        self.head = head
+        self.color = color
+
+    @classmethod
+    def from_pgn(cls, pgn):
+        if pgn.startswith("G"):
+            color = "green"
+            pgn = pgn[1:]
+        elif pgn.startswith("R"):
+            color = "red"
+            pgn = pgn[1:]
+        elif pgn.startswith("Y"):
+            color = "yellow"
+            pgn = pgn[1:]
+        elif pgn.startswith("B"):
+            color = "blue"
+            pgn = pgn[1:]
+        elif pgn.startswith("W"):
+            color = "white"
+            pgn = pgn[1:]
+        elif pgn.startswith("K"):
+            color = "black"
+            pgn = pgn[1:]
+        else:
+            color = "green"
+
+        if len(pgn) > 2 and pgn[2].isdigit():
+            # rank > 9
+            tail = pgn[:3]
+            head = pgn[3:] if len(pgn) > 3 else tail
+        else:
+            tail = pgn[:2]
+            head = pgn[2:] if len(pgn) > 2 else tail
+        return cls(tail, head, color=color)
+
+    def pgn(self):
+        """
+        Returns the arrow in the format understood by :func:`Arrow.from_pgn()`,
+        e.g., ``Ge2e4``, or ``Rh7`` for a circle.
+        """
+        prefix = ARROW_COLOR_PREFIXES.get(self.color, "G")
+        if self.tail == self.head:
+            return prefix + self.tail
+        return prefix + self.tail + self.head
+
+    def __repr__(self):
+        return "%s%s%s" % (self.color[0].upper(), self.head, self.tail)
+
+
+class Piece:
+    """
+    A piece type and color, which may be promoted.
+
+    Pieces are immutable flyweights: there is one instance per combination,
+    with a precomputed :attr:`symbol` and a small :attr:`index`, which boards
+    store per square (see :data:`PIECE_TABLE`).
+    """
+    __slots__ = ("piece_type", "color", "_promoted", "symbol", "index")
+
+    def __new__(cls, piece_type, color, promoted=False):
+        color, promoted = bool(color), bool(promoted)
+        index = 1 + 4 * piece_type + 2 * color + promoted
+        piece = PIECE_TABLE[index]
+        if piece is None:
+            piece = object.__new__(cls)
+            piece.piece_type = piece_type
+            piece.color = color
+            piece._promoted = promoted
+            letter = PIECE_LETTERS[piece_type]
+            piece.symbol = ("p" if promoted else "") + (letter.upper() if color == WHITE else letter)
+            piece.index = index
+            PIECE_TABLE[index] = piece
+        return piece
+
+    @property
+    def promoted(self):
+        return self._promoted
+
+    def __reduce__(self):
+        return Piece, (self.piece_type, self.color, self._promoted)
+
+    @classmethod
+    def from_letter(cls, letter):
+        if letter.islower():
+            return cls(PIECE_LETTERS.index(letter), BLACK)
+        else:
+            return cls(PIECE_LETTERS.index(letter.lower()), WHITE)
+
+    @classmethod
+    def from_symbol(cls, symbol):
+        """Inverse of :attr:`Piece.symbol`, e.g., ``pP`` for a promoted white pawn."""
+        piece = cls.from_letter(symbol[-1])
+        return cls(piece.piece_type, piece.color, len(symbol) > 1 and symbol[0] == "p")
+
+    def __repr__(self):
+        return self.symbol
+
+    def __str__(self):
+        return self.symbol
+
+
+# The pieces by index, index 0 being an empty square. The indexes only depend
+# on the piece, so that boards can be passed between processes.
+PIECE_TABLE = [None] * (1 + 4 * len(PIECE_LETTERS))
+
+
+class Move:
+    def __init__(self, from_square, to_square, promotion=None, drop=None, promoted=False):
+        self.from_square = from_square
+        self.to_square = to_square
+        self.promotion = promotion
+        self.drop = drop
+        self.promoted = promoted
+
+    @classmethod
+    def from_uci(cls, uci):
+        # A + suffix promotes the piece in place, e.g., in shogi.
+        promoted = uci.endswith("+")
+        if promoted:
+            uci = uci[:-1]
+
+        if "@" == uci[1]:
+            drop = PIECE_LETTERS.index(uci[0].lower())
+            square = uci[2:]
+            return cls(square, square, drop=drop)
+        elif 4 <= len(uci) <= 5:
+            if uci[-1].islower():
+                promotion = PIECE_LETTERS.index(uci[-1])
+                uci = uci[:-1]
+            else:
+                promotion = None
+
+            if uci[2].isdigit():
+                from_square = uci[0:3]
+                to_square = uci[3:]
+            else:
+                from_square = uci[0:2]
+                to_square = uci[2:]
+            return cls(from_square, to_square, promotion=promotion, promoted=promoted)
+
+
+class Board:
+    """
+    A board of *rows* x *cols* squares, with the pieces stored as one byte
+    per square, indexing :data:`PIECE_TABLE`. The number of pieces of each
+    type and color is maintained along with the squares.
+    """
+    __slots__ = ("rows", "cols", "turn", "move_stack", "squares", "_counts", "_undo", "_hash")
+
+    def __init__(self, board_fen, css, rows=8, cols=8):
+        self.rows = rows
+        self.cols = cols
+        self.turn = WHITE
+        if board_fen is None:
+            self.clear_board()
+        else:
+            self.set_board_fen(css, board_fen)
+
+    def clear_board(self):
+        self.squares = bytearray(self.rows * self.cols)
+        self._counts = [0] * (2 * len(PIECE_LETTERS))
+        self.move_stack = []
+        self._undo = []
+        self._hash = self._compute_hash()
+
+    @property
+    def pieces(self):
+        """
+        The pieces on the board by (row, col). The dict is built on access, so
+        changing it does not change the board.
+        """
+        cols = self.cols
+        return {divmod(index, cols): PIECE_TABLE[value] for index, value in enumerate(self.squares) if value}
+
+    def _compute_hash(self):
+        h = zobrist_key(self.rows, self.cols, "board")
+        for (row, col), piece in self.pieces.items():
+            h ^= zobrist_key(row, col, piece.symbol)
+        return h ^ ZOBRIST_BLACK if self.turn == BLACK else h
+
+    def zobrist_hash(self):
+        """
+        Returns a 64 bit hash of the board shape, the pieces and the side to
+        move. It is maintained incrementally by :func:`push()` and
+        :func:`pop()`.
+        """
+        return self._hash
+
+    def set_turn(self, color):
+        """Sets the side to move, updating :func:`zobrist_hash()`."""
+        color = bool(color)
+        if color != self.turn:
+            self.turn = color
+            self._hash ^= ZOBRIST_BLACK
+
+    def contains_piece(self, piece_type, color):
+        return self._counts[2 * piece_type + color] > 0
+
+    def piece_at(self, row, col):
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return PIECE_TABLE[self.squares[row * self.cols + col]]
+        return None
+
+    def parse_square(self, name):
+        """
+        Returns the row and column of a square name, e.g., ``e4``. Raises
+        :exc:`ValueError` if the square is not on the board.
+        """
+        row, col = self.rows - int(name[1:]), ord(name[0]) - ord("a")
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise ValueError("%s is not on the board" % name)
+        return row, col
+
+    def _put(self, square, piece):
+        row, col = square
+        index = row * self.cols + col
+        old = PIECE_TABLE[self.squares[index]]
+        if old is not None:
+            self._hash ^= zobrist_key(row, col, old.symbol)
+            self._counts[2 * old.piece_type + old.color] -= 1
+        if piece is not None:
+            self.squares[index] = piece.index
+            self._hash ^= zobrist_key(row, col, piece.symbol)
+            self._counts[2 * piece.piece_type + piece.color] += 1
+        else:
+            self.squares[index] = 0
+
+    def push(self, move):
+        """
+        Plays a move in place. Drops are made for the side to move. Castling
+        (including the king taking its own rook) and en passant captures move
+        or remove the other piece, a promotion letter replaces the piece, and
+        a ``+`` suffix sets its promoted state. No other legality checks are
+        done. Returns the squares whose content changed as (row, col).
+        """
+        undo = []
+
+        def put(square, piece):
+            undo.append((square, self.piece_at(*square)))
+            self._put(square, piece)
+
+        to_square = self.parse_square(move.to_square)
+        if move.drop is not None:
+            put(to_square, Piece(move.drop, self.turn))
+        else:
+            from_square = self.parse_square(move.from_square)
+            piece = self.piece_at(*from_square)
+            if piece is None:
+                raise ValueError("no piece on %s" % move.from_square)
+            put(from_square, None)
+            (from_row, from_col), (to_row, to_col) = from_square, to_square
+            target = self.piece_at(*to_square)
+
+            if piece.piece_type == KING and from_row == to_row:
+                step = 1 if to_col > from_col else -1
+                rook_square = None
+                if target is not None and target.color == piece.color and target.piece_type == ROOK:
+                    # The king takes its own rook and goes to the castling square.
+                    rook_square = to_square
+                    to_square = (to_row, self.cols - 2 if step > 0 else 2)
+                elif abs(to_col - from_col) >= 2:
+                    # The rook is the first piece beyond the target of the king.
+                    for col in range(to_col + step, self.cols if step > 0 else -1, step):
+                        other = self.piece_at(to_row, col)
+                        if other is not None:
+                            if other.color == piece.color and other.piece_type == ROOK:
+                                rook_square = (to_row, col)
+                            break
+                if rook_square is not None:
+                    rook = self.piece_at(*rook_square)
+                    put(rook_square, None)
+                    put((to_row, to_square[1] - step), rook)
+            elif piece.piece_type == PAWN and from_row != to_row and from_col != to_col and target is None:
+                # En passant
+                captured = self.piece_at(from_row, to_col)
+                if captured is not None and captured.piece_type == PAWN and captured.color != piece.color:
+                    put((from_row, to_col), None)
+
+            if move.promotion is not None:
+                piece = Piece(move.promotion, piece.color)
+            if move.promoted:
+                piece = Piece(piece.piece_type, piece.color, True)
+            put(to_square, piece)
+
+        self.turn = not self.turn
+        self._hash ^= ZOBRIST_BLACK
+        self.move_stack.append(move)
+        self._undo.append(undo)
+        return list(dict.fromkeys(square for square, _ in undo))
+
+    def pop(self):
+        """Takes back the last move played with :func:`push()` and returns it."""
+        move = self.move_stack.pop()
+        for square, piece in reversed(self._undo.pop()):
+            self._put(square, piece)
+        self.turn = not self.turn
+        self._hash ^= ZOBRIST_BLACK
+        return move
+
+    def set_board_fen(self, css, fen):
+        expire_missing()
+        if css not in SVG_PIECES:
+            get_svg_pieces_from_css(css)
+
+        fields = fen.split()
+        fen = fields[0].strip()  # Ignore any additional FEN parts, except the side to move
+        self.turn = BLACK if len(fields) > 1 and fields[1] == "b" else WHITE
+        rows = fen.split("/")
+        if len(rows) > MAX_ROWS:
+            raise ValueError("more than %d ranks" % MAX_ROWS)
+
+        # Parse the pieces as (row, col, piece), the number of columns is
+        # only known at the end.
+        placed = []
+        for row_index, row in enumerate(rows):
+            col_index = 0
+            empty = ""
+            promoted_plus = False
+            for c in row:
+                if c in string.digits:
+                    # Numbers of empty squares may have more than one digit.
+                    empty += c
+                    if col_index + int(empty) > MAX_COLS:
+                        raise ValueError("more than %d files" % MAX_COLS)
+                    continue
+                if empty:
+                    col_index += int(empty)
+                    empty = ""
+
+                if c not in "~+":
+                    piece = Piece.from_letter(c)
+                    if promoted_plus:
+                        piece = Piece(piece.piece_type, piece.color, True)
+                        promoted_plus = False
+
+                    if col_index >= MAX_COLS:
+                        raise ValueError("more than %d files" % MAX_COLS)
+                    placed.append((row_index, col_index, piece))
+                    col_index += 1
+
+                    # Read piece SVG
+                    if piece.symbol not in SVG_PIECES[css]:
+                        read_piece_svg(css, piece)
+                else:
+                    if c == "~" and placed:
+                        last_row, last_col, piece = placed[-1]
+                        piece = Piece(piece.piece_type, piece.color, True)
+                        placed[-1] = (last_row, last_col, piece)
+                        if piece.symbol not in SVG_PIECES[css]:
+                            read_piece_svg(css, piece)
+                    if c == "+":
+                        promoted_plus = True
+            if empty:
+                col_index += int(empty)
+
+        self.rows = len(rows)
+        self.cols = col_index
+        self.clear_board()
+        for row, col, piece in placed:
+            if col < self.cols:
+                self._put((row, col), piece)
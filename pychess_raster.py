@@ -0,0 +1,364 @@
+"""
+Renders board PNGs by compositing pre-rasterized sprites.
+
+cairosvg is only used to rasterize each piece once per piece set, symbol and
+square size, the board background once per geometry and theme, and the
+arrows, if any. Everything else is alpha blended with Pillow.
+"""
+
+import argparse
+import collections
+import io
+import json
+
+import cairosvg
+import numpy as np
+from PIL import Image, ImageColor
+
+import pychess
+import pychess_svg
+from pychess_svg import SQUARE_SIZE, SVG_PIECES, DEFAULT_COLORS
+
+
+def _image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class ImageCache:
+    """
+    A least recently used cache of images, bounded by the total number of
+    bytes of their pixels, like the response cache of the server.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        try:
+            image = self.entries[key]
+        except KeyError:
+            return None
+        self.entries.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        size = _image_bytes(image)
+        if size > self.max_bytes:
+            return
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= _image_bytes(old)
+        self.entries[key] = image
+        self.size += size
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= _image_bytes(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+# Rasterized pieces and markup, and board backgrounds, in each process
+SPRITES = ImageCache(64 * 1024 * 1024)
+BACKGROUNDS = ImageCache(64 * 1024 * 1024)
+
+# Pre-rasterized sprites shared by all worker processes, see load_atlas()
+ATLAS = None
+ATLAS_INDEX = {}
+
+
+def _rasterize(svg, width, height):
+    png = cairosvg.svg2png(bytestring=svg.encode("utf-8"), output_width=width, output_height=height)
+    return Image.open(io.BytesIO(png)).convert("RGBA")
+
+
+def _square_svg(content):
+    return """<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" viewBox="0 0 %d %d">%s</svg>""" % (SQUARE_SIZE, SQUARE_SIZE, content)
+
+
+def _load_piece(css, piece):
+    # Pieces are loaded while parsing the FEN, but that may have happened in
+    # another process.
+    pychess_svg.expire_missing()
+    if css not in SVG_PIECES:
+        pychess_svg.get_svg_pieces_from_css(css)
+    if piece.symbol not in SVG_PIECES[css]:
+        pychess_svg.read_piece_svg(css, piece)
+
+
+def piece_sprite(css, piece, size, rotated=False):
+    """Returns the piece rasterized to *size* x *size* pixels."""
+    key = (css, piece.symbol, size, rotated)
+    sprite = SPRITES.get(key)
+    if sprite is not None:
+        return sprite
+
+    if rotated:
+        sprite = piece_sprite(css, piece, size).transpose(Image.Transpose.ROTATE_180)
+    elif _atlas_key(css, piece.symbol, size) in ATLAS_INDEX:
+        offset = ATLAS_INDEX[_atlas_key(css, piece.symbol, size)]
+        # Zero-copy view of the memory mapped atlas
+        buffer = ATLAS[offset:offset + size * size * 4]
+        sprite = Image.frombuffer("RGBA", (size, size), buffer, "raw", "RGBA", 0, 1)
+    else:
+        _load_piece(css, piece)
+        sprite = _rasterize(pychess_svg.piece(css, piece), size, size)
+    SPRITES.put(key, sprite)
+    return sprite
+
+
+def _atlas_key(css, symbol, size):
+    return "%s|%s|%d" % (css, symbol, size)
+
+
+def load_atlas(path):
+    """
+    Opens a sprite atlas built with ``python pychess_raster.py build-atlas``.
+    The sprites are memory mapped, so that all processes share them through
+    the page cache, and rasterizing pieces of these sizes is never needed.
+    """
+    global ATLAS, ATLAS_INDEX
+    with open(path + ".json") as f:
+        index = json.load(f)
+    ATLAS = np.load(path + ".npy", mmap_mode="r")
+    ATLAS_INDEX = index["sprites"]
+    SPRITES.clear()
+
+
+def build_atlas(path, sizes, css_list=None):
+    """
+    Rasterizes every piece of the given piece sets (default: all piece sets in
+    :data:`pychess_svg.STATIC_PATH`) at the given square sizes into an atlas.
+    """
+    if css_list is None:
+        css_list = pychess_svg.piece_sets()
+
+    chunks = []
+    index = {}
+    offset = 0
+    for css in css_list:
+        pychess_svg.load_piece_set(css)
+        for symbol, svg in sorted(SVG_PIECES[css].items()):
+            if not svg:
+                continue
+            piece = pychess.Piece.from_symbol(symbol)
+            for size in sizes:
+                data = np.asarray(_rasterize(pychess_svg.piece(css, piece), size, size), dtype=np.uint8).reshape(-1)
+                chunks.append(data)
+                index[_atlas_key(css, symbol, size)] = offset
+                offset += len(data)
+        print("%s: %d pieces" % (css, len(SVG_PIECES[css])))
+
+    np.save(path + ".npy", np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8))
+    with open(path + ".json", "w") as f:
+        json.dump({"sizes": sizes, "sprites": index}, f)
+    print("%s.npy: %d sprites, %d bytes" % (path, len(index), offset))
+
+
+def _markup_sprite(name, svg, size):
+    key = (name, size)
+    sprite = SPRITES.get(key)
+    if sprite is None:
+        sprite = _rasterize(_square_svg(svg), size, size)
+        SPRITES.put(key, sprite)
+    return sprite
+
+
+def _check_sprite(size):
+    return _markup_sprite("check", "<defs>%s</defs><rect width=\"%d\" height=\"%d\" fill=\"url(#check_gradient)\" />" % (pychess_svg.CHECK_GRADIENT, SQUARE_SIZE, SQUARE_SIZE), size)
+
+
+def _xx_sprite(size):
+    return _markup_sprite("xx", pychess_svg.XX, size)
+
+
+def _background(rows, cols, orientation, coordinates, width, height, colors, background_image, compact):
+    key = (rows, cols, orientation, coordinates, width, height, colors, background_image, compact)
+    image = BACKGROUNDS.get(key)
+    if image is None:
+        empty = pychess.Board(None, None, rows=rows, cols=cols)
+        svg = pychess_svg.board(None, empty, orientation=orientation, width=width, height=height, colors=dict(colors),
+                                coordinates=coordinates, background_image=background_image, engine="template", compact=compact)
+        image = _rasterize(svg, None, None)
+        BACKGROUNDS.put(key, image)
+    return image
+
+
+class _Geometry:
+    """Maps document coordinates to pixels, like the SVG viewBox does."""
+
+    def __init__(self, board, orientation, coordinates, width, height):
+        self.margin = 15 if coordinates else 0
+        self.positions = pychess_svg._geometry(board.rows, board.cols, orientation, self.margin)
+        total_width = board.cols * SQUARE_SIZE + 2 * self.margin
+        total_height = board.rows * SQUARE_SIZE + 2 * self.margin
+
+        # Like pychess_svg.board(): with coordinates the image has the size of
+        # the viewBox.
+        self.width = total_width if coordinates or width is None else width
+        self.height = total_height if coordinates or height is None else height
+
+        # preserveAspectRatio="xMidYMid meet"
+        self.scale = min(self.width / total_width, self.height / total_height)
+        self.offset_x = (self.width - total_width * self.scale) / 2
+        self.offset_y = (self.height - total_height * self.scale) / 2
+        self.square_size = round(SQUARE_SIZE * self.scale)
+
+    def square(self, row, col):
+        """Returns the pixel box of a square."""
+        x, y = self.positions.origins[row][col]
+        left = round(self.offset_x + x * self.scale)
+        top = round(self.offset_y + y * self.scale)
+        return left, top, left + self.square_size, top + self.square_size
+
+
+def _lastmove_color(colors, row, col):
+    cls = "square %s lastmove" % ("light" if col % 2 == row % 2 else "dark")
+    return ImageColor.getcolor(colors.get(cls, DEFAULT_COLORS[cls]), "RGBA")
+
+
+def _board_image(css, board, orientation, check, lastmove, arrows, squares, width, height, colors, coordinates, background_image, rotate_opponent, compact):
+    geometry = _Geometry(board, orientation, coordinates, width, height)
+    size = geometry.square_size
+
+    image = _background(board.rows, board.cols, orientation, coordinates, width, height,
+                        tuple(sorted(colors.items())), background_image, compact).copy()
+
+    def on_board(row, col):
+        return 0 <= row < board.rows and 0 <= col < board.cols
+
+    # Highlights are only drawn on the default squares.
+    if not background_image:
+        if lastmove:
+            for square in dict.fromkeys((lastmove.from_square, lastmove.to_square)):
+                row, col = geometry.positions.square(square)
+                if on_board(row, col):
+                    image.paste(_lastmove_color(colors, row, col), geometry.square(row, col))
+
+        if squares:
+            for row, col in dict.fromkeys(geometry.positions.square(square) for square in squares):
+                if on_board(row, col):
+                    image.alpha_composite(_xx_sprite(size), geometry.square(row, col)[:2])
+
+    check_square = geometry.positions.square(check) if check is not None else None
+
+    for (row, col), piece in board.pieces.items():
+        if not on_board(row, col):
+            continue
+        box = geometry.square(row, col)
+        if (row, col) == check_square:
+            image.alpha_composite(_check_sprite(size), box[:2])
+        rotated = rotate_opponent and piece.color != (1 if orientation else 0)
+        image.alpha_composite(piece_sprite(css, piece, size, rotated), box[:2])
+
+    if arrows:
+        overlay = pychess_svg.arrows(board, arrows, orientation=orientation, width=width, height=height, colors=colors, coordinates=coordinates)
+        image.alpha_composite(_rasterize(overlay, None, None))
+
+    return image
+
+
+def board_png(css, board, orientation=True, flipped=False, check=None, lastmove=None, arrows=(), squares=None, width=None, height=None, colors=None, coordinates=False, background_image=None, rotate_opponent=False, compact=False):
+    """
+    Renders a board as a PNG image. Takes the same arguments as
+    :func:`pychess_svg.board()`.
+    """
+    image = _board_image(css, board, orientation ^ flipped, check, lastmove, arrows, squares, width, height, colors or {},
+                         coordinates, background_image, rotate_opponent, compact)
+    output = io.BytesIO()
+    image.save(output, "PNG")
+    return output.getvalue()
+
+
+ANIMATION_FORMATS = ["gif", "webp", "png"]
+
+
+def animation(css, board, moves, fmt="gif", color=None, orientation=True, flipped=False, lastmove=None, width=None, height=None, colors=None, coordinates=False, background_image=None, rotate_opponent=False, compact=False, duration=500):
+    """
+    Renders an animated image (``gif``, ``webp`` or ``png``, i.e., APNG)
+    showing *moves* played from *board* with :func:`pychess.Board.push()`,
+    one frame per move, *duration* milliseconds each. *color* overrides the
+    side to move in the first position. *board* is modified in place.
+
+    The first frame is rendered like :func:`board_png()`, after that only the
+    squares changed by each move and the last move highlights are repainted,
+    so that the encoder stores each frame as a small patch of the previous
+    one.
+    """
+    colors = colors or {}
+    orientation ^= flipped
+    geometry = _Geometry(board, orientation, coordinates, width, height)
+    size = geometry.square_size
+    background = _background(board.rows, board.cols, orientation, coordinates, width, height,
+                             tuple(sorted(colors.items())), background_image, compact)
+
+    image = _board_image(css, board, orientation, None, lastmove, (), None, width, height, colors,
+                         coordinates, background_image, rotate_opponent, compact)
+    frames = [image.copy()]
+    # The distinct squares painted after the first frame, whose colors have
+    # to be in the GIF palette, e.g., the last move highlights.
+    patches = {}
+    if color is not None:
+        board.set_turn(color)
+
+    def highlighted(move):
+        if move is None or background_image:
+            return []
+        return [geometry.positions.square(square) for square in (move.from_square, move.to_square)]
+
+    for move in moves:
+        changed = board.push(move) + highlighted(lastmove) + highlighted(move)
+        for row, col in dict.fromkeys(changed):
+            if not (0 <= row < board.rows and 0 <= col < board.cols):
+                continue
+            box = geometry.square(row, col)
+            image.paste(background.crop(box), box[:2])
+            if (row, col) in highlighted(move):
+                image.paste(_lastmove_color(colors, row, col), box)
+            piece = board.piece_at(row, col)
+            if piece:
+                rotated = rotate_opponent and piece.color != (1 if orientation else 0)
+                image.alpha_composite(piece_sprite(css, piece, size, rotated), box[:2])
+            if fmt == "gif":
+                patch = image.crop(box)
+                patches.setdefault(patch.tobytes(), patch)
+        lastmove = move
+        frames.append(image.copy())
+
+    output = io.BytesIO()
+    if fmt == "gif":
+        # One palette for all frames, without dithering, so that unchanged
+        # pixels stay identical and only the changed area is stored. It is
+        # built from the first frame and all squares painted after it.
+        per_row = max(image.width // size, 1)
+        source = Image.new("RGB", (image.width, image.height + size * -(-len(patches) // per_row)))
+        source.paste(frames[0].convert("RGB"))
+        for index, patch in enumerate(patches.values()):
+            row, col = divmod(index, per_row)
+            source.paste(patch.convert("RGB"), (col * size, image.height + row * size))
+        palette = source.quantize()
+        frames = [frame.convert("RGB").quantize(palette=palette, dither=Image.Dither.NONE) for frame in frames]
+        frames[0].save(output, "GIF", save_all=True, append_images=frames[1:], duration=duration, loop=0, disposal=1)
+    elif fmt == "webp":
+        frames[0].save(output, "WEBP", save_all=True, append_images=frames[1:], duration=duration, loop=0, lossless=True)
+    elif fmt == "png":
+        frames[0].save(output, "PNG", save_all=True, append_images=frames[1:], duration=duration, loop=0)
+    else:
+        raise ValueError("unknown animation format: %r" % fmt)
+    return output.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds a memory mappable atlas of pre-rasterized piece sprites")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build-atlas", help="rasterize piece sets into an atlas")
+    build.add_argument("--output", "-o", default="sprites", help="atlas path without extension (default: sprites)")
+    build.add_argument("--sizes", default="32,40,45,64", help="comma separated square sizes in pixels (default: 32,40,45,64)")
+    build.add_argument("css", nargs="*", help="piece sets, e.g., standard/standard (default: all)")
+    args = parser.parse_args()
+
+    build_atlas(args.output, [int(size) for size in args.sizes.split(",")], args.css or None)
@@ -1,536 +1,1607 @@
-import pychess
-import math
-import os
-from typing import Dict, Tuple, Union
-
-import svgutils
-from lxml.etree import tostring
-
-import xml.etree.ElementTree as ET
-
-
-SQUARE_SIZE = 45
-MARGIN = 20
-
-SVG_PIECES = {}
-SVG_PATH_PIECES = {}
-
-
-XX = """<g id="xx"><path d="M35.865 9.135a1.89 1.89 0 0 1 0 2.673L25.173 22.5l10.692 10.692a1.89 1.89 0 0 1 0 2.673 1.89 1.89 0 0 1-2.673 0L22.5 25.173 11.808 35.865a1.89 1.89 0 0 1-2.673 0 1.89 1.89 0 0 1 0-2.673L19.827 22.5 9.135 11.808a1.89 1.89 0 0 1 0-2.673 1.89 1.89 0 0 1 2.673 0L22.5 19.827 33.192 9.135a1.89 1.89 0 0 1 2.673 0z" fill="#000" stroke="#fff" stroke-width="1.688"/></g>"""  # noqa: E501
-
-CHECK_GRADIENT = """<radialGradient id="check_gradient" r="0.5"><stop offset="0%" stop-color="#ff0000" stop-opacity="1.0" /><stop offset="50%" stop-color="#e70000" stop-opacity="1.0" /><stop offset="100%" stop-color="#9e0000" stop-opacity="0.0" /></radialGradient>"""  # noqa: E501
-
-DEFAULT_COLORS = {
-    "square light": "#f0d9b5",
-    "square dark": "#b58863",
-    "square dark lastmove": "#aaa23b",
-    "square light lastmove": "#cdd16a",
-    "margin": "#212121",
-    "inner border": "#111",
-    "outer border": "#111",
-    "coord": "#333333",
-    "arrow green": "#15781B80",
-    "arrow red": "#88202080",
-    "arrow yellow": "#e68f00b3",
-    "arrow blue": "#00308880",
-    "arrow white": "#FFFFFF80",
-    "arrow black": "#00000080",
-}
-
-
-STATIC_PATH = "pychess-variants/static/"
-
-
-def get_svg_pieces_from_css(css):
-    SVG_PIECES[css] = {}
-    SVG_PATH_PIECES[css] = {}
-    css_path = os.path.join(STATIC_PATH, "piece", css + ".css")
-    if not os.path.isfile(css_path):
-        print("ERROR: FileNotFoundError %s" % css_path)
-        return
-    with open(css_path) as css_file:
-        color, symbol, url = "", "", ""
-        promoted = False
-        for line in css_file:
-            if line.strip():
-                if "piece." in line:
-                    color = "white" if ("white" in line or "ally" in line) else "black"
-                    start = line.find("piece.") + 6
-                    end = line.find("-piece")
-                    symbol = line[start:end]
-                    if "promoted" in line:
-                        promoted = True
-                if "url" in line:
-                    start = line.find("url(") + 5
-                    end = line.find(")") - 1
-                    url = line[start:end]
-                if symbol and url:
-                    if color == "white":
-                        letters = list(symbol)
-                        letters[-1] = letters[-1].upper()
-                        symbol = ''.join(letters)
-                    if promoted:
-                        symbol = "p" + symbol
-                    SVG_PATH_PIECES[css][symbol] = url
-                    color, symbol, url = "", "", ""
-                    promoted = False
-
-
-def square_file(square):
-    return ord(square[0]) - 97
-
-
-def square_rank(square):
-    return int(square[1:]) - 1
-
-
-def parse_squares(board, squares):
-    parsed = []
-    for square in squares:
-        parsed.append((board.rows - square_rank(square) - 1, square_file(square)))
-    return parsed
-
-
-def read_piece_svg(css, piece):
-    symbol = piece.symbol
-    piece_name = "%s-piece" % symbol
-
-    if symbol not in SVG_PATH_PIECES[css]:
-        return
-
-    piece_svg = SVG_PATH_PIECES[css][symbol]
-
-    orig_file = os.path.normpath(os.path.join(STATIC_PATH, "piece", css, "..", piece_svg))
-    if not os.path.isfile(orig_file):
-        print("ERROR: FileNotFoundError %s" % orig_file)
-        return
-
-    if orig_file[-3:] != "svg":
-        print("ERROR: %s is not in .svg format" % orig_file)
-        return
-
-    # This can read "viewBox" but can't do scale()
-    svg_full = svgutils.transform.fromfile(orig_file)
-
-    viewBox = svg_full.root.get("viewBox")
-
-    # This can't read "viewBox" but can do scale()
-    try:
-        svg = svgutils.compose.SVG(orig_file)
-    except AttributeError:
-        print("ERROR: Possible %s referenced in %s.css has no 'width/height'" % (orig_file, css))
-        # TODO: add "width/height" to .svg
-        raise
-
-    if viewBox is not None:
-        width = float(viewBox.split()[2])
-    elif svg.width is not None:
-        width = svg.width
-    else:
-        SVG_PIECES[css][symbol] = ""
-        return
-
-    if width != SQUARE_SIZE:
-        new = SQUARE_SIZE / width
-        svg.scale(new)
-
-    head = """<g id="%s-%s">""" % (pychess.COLOR_NAMES[piece.color], piece_name)
-    tail = """</g>"""
-
-    SVG_PIECES[css][symbol] = "%s%s%s" % (head, tostring(svg.root), tail)
-
-
-class SvgWrapper(str):
-    def _repr_svg_(self):
-        return self
-
-
-def _svg(viewbox_x, viewbox_y, width, height):
-    svg = ET.Element("svg", {
-        "xmlns": "http://www.w3.org/2000/svg",
-        "version": "1.1",
-        "xmlns:xlink": "http://www.w3.org/1999/xlink",
-        "viewBox": "0 0 %d %d" % (viewbox_x, viewbox_y),
-    })
-
-    if width is not None:
-        svg.set("width", str(width))
-    if height is not None:
-        svg.set("height", str(height))
-
-    return svg
-
-
-def _attrs(attrs: Dict[str, Union[str, int, float, None]]) -> Dict[str, str]:
-    return {k: str(v) for k, v in attrs.items() if v is not None}
-
-
-def _select_color(colors: Dict[str, str], color: str) -> Tuple[str, float]:
-    return _color(colors.get(color, DEFAULT_COLORS[color]))
-
-
-def _color(color: str) -> Tuple[str, float]:
-    if color.startswith("#"):
-        try:
-            if len(color) == 5:
-                return color[:4], int(color[4], 16) / 0xf
-            elif len(color) == 9:
-                return color[:7], int(color[7:], 16) / 0xff
-        except ValueError:
-            pass  # Ignore invalid hex value
-    return color, 1.0
-
-
-def piece(css, piece, size=None):
-    """
-    Renders the given :class:`pychess.Piece` as an SVG image.
-    """
-    svg = _svg(SQUARE_SIZE, SQUARE_SIZE, size, size)
-    svg.append(ET.fromstring(SVG_PIECES[css][piece.symbol]))
-    return SvgWrapper(ET.tostring(svg).decode("utf-8"))
-
-
-def _colors_to_css(colors: Dict[str, str]) -> str:
-    """Convert a color mapping dictionary into a CSS string."""
-    lines = []
-    for selector, value in colors.items():
-        classes = "." + ".".join(selector.split())
-        lines.append(f"{classes} {{ fill: {value}; }}")
-    return "\n".join(lines)
-
-
-# SVG path definitions for coordinate glyphs (a-l, 1-12, etc.)
-COORD_SVG_PATHS = {
-    'a': "<path d='M5.654296875 4.697265625Q3.4765625 4.697265625 2.63671875 5.1953125Q1.796875 5.693359375 1.796875 6.89453125Q1.796875 7.8515625 2.4267578125 8.4130859375Q3.056640625 8.974609375 4.140625 8.974609375Q5.634765625 8.974609375 6.5380859375 7.9150390625Q7.44140625 6.85546875 7.44140625 5.09765625V4.697265625ZM9.23828125 3.955078125V10.1953125H7.44140625V8.53515625Q6.826171875 9.53125 5.908203125 10.0048828125Q4.990234375 10.478515625 3.662109375 10.478515625Q1.982421875 10.478515625 0.9912109375 9.5361328125Q0.0 8.59375 0.0 7.01171875Q0.0 5.166015625 1.2353515625 4.228515625Q2.470703125 3.291015625 4.921875 3.291015625H7.44140625V3.115234375Q7.44140625 1.875 6.6259765625 1.1962890625Q5.810546875 0.517578125 4.3359375 0.517578125Q3.3984375 0.517578125 2.509765625 0.7421875Q1.62109375 0.966796875 0.80078125 1.416015625V-0.244140625Q1.787109375 -0.625 2.71484375 -0.8154296875Q3.642578125 -1.005859375 4.521484375 -1.005859375Q6.89453125 -1.005859375 8.06640625 0.224609375Q9.23828125 1.455078125 9.23828125 3.955078125Z'/>",
-    'b': "<path d='M7.919921875 4.736328125Q7.919921875 2.75390625 7.1044921875 1.6259765625Q6.2890625 0.498046875 4.86328125 0.498046875Q3.4375 0.498046875 2.6220703125 1.6259765625Q1.806640625 2.75390625 1.806640625 4.736328125Q1.806640625 6.71875 2.6220703125 7.8466796875Q3.4375 8.974609375 4.86328125 8.974609375Q6.2890625 8.974609375 7.1044921875 7.8466796875Q7.919921875 6.71875 7.919921875 4.736328125ZM1.806640625 0.91796875Q2.373046875 -0.05859375 3.2373046875 -0.5322265625Q4.1015625 -1.005859375 5.302734375 -1.005859375Q7.294921875 -1.005859375 8.5400390625 0.576171875Q9.78515625 2.158203125 9.78515625 4.736328125Q9.78515625 7.314453125 8.5400390625 8.896484375Q7.294921875 10.478515625 5.302734375 10.478515625Q4.1015625 10.478515625 3.2373046875 10.0048828125Q2.373046875 9.53125 1.806640625 8.5546875V10.1953125H0.0V-5.0H1.806640625Z'/>",
-    'c': "<path d='M8.65234375 -0.322265625V1.357421875Q7.890625 0.9375 7.1240234375 0.7275390625Q6.357421875 0.517578125 5.576171875 0.517578125Q3.828125 0.517578125 2.861328125 1.6259765625Q1.89453125 2.734375 1.89453125 4.736328125Q1.89453125 6.73828125 2.861328125 7.8466796875Q3.828125 8.955078125 5.576171875 8.955078125Q6.357421875 8.955078125 7.1240234375 8.7451171875Q7.890625 8.53515625 8.65234375 8.115234375V9.775390625Q7.900390625 10.126953125 7.0947265625 10.302734375Q6.2890625 10.478515625 5.380859375 10.478515625Q2.91015625 10.478515625 1.455078125 8.92578125Q0.0 7.373046875 0.0 4.736328125Q0.0 2.060546875 1.4697265625 0.52734375Q2.939453125 -1.005859375 5.498046875 -1.005859375Q6.328125 -1.005859375 7.119140625 -0.8349609375Q7.91015625 -0.6640625 8.65234375 -0.322265625Z'/>",
-    'd': "<path d='M7.978515625 0.91796875V-5.0H9.775390625V10.1953125H7.978515625V8.5546875Q7.412109375 9.53125 6.5478515625 10.0048828125Q5.68359375 10.478515625 4.47265625 10.478515625Q2.490234375 10.478515625 1.2451171875 8.896484375Q0.0 7.314453125 0.0 4.736328125Q0.0 2.158203125 1.2451171875 0.576171875Q2.490234375 -1.005859375 4.47265625 -1.005859375Q5.68359375 -1.005859375 6.5478515625 -0.5322265625Q7.412109375 -0.05859375 7.978515625 0.91796875ZM1.85546875 4.736328125Q1.85546875 6.71875 2.6708984375 7.8466796875Q3.486328125 8.974609375 4.912109375 8.974609375Q6.337890625 8.974609375 7.158203125 7.8466796875Q7.978515625 6.71875 7.978515625 4.736328125Q7.978515625 2.75390625 7.158203125 1.6259765625Q6.337890625 0.498046875 4.912109375 0.498046875Q3.486328125 0.498046875 2.6708984375 1.6259765625Q1.85546875 2.75390625 1.85546875 4.736328125Z'/>",
-    'e': "<path d='M10.13671875 4.27734375V5.15625H1.875Q1.9921875 7.01171875 2.9931640625 7.9833984375Q3.994140625 8.955078125 5.78125 8.955078125Q6.81640625 8.955078125 7.7880859375 8.701171875Q8.759765625 8.447265625 9.716796875 7.939453125V9.638671875Q8.75 10.048828125 7.734375 10.263671875Q6.71875 10.478515625 5.673828125 10.478515625Q3.056640625 10.478515625 1.5283203125 8.955078125Q0.0 7.431640625 0.0 4.833984375Q0.0 2.1484375 1.4501953125 0.5712890625Q2.900390625 -1.005859375 5.361328125 -1.005859375Q7.568359375 -1.005859375 8.8525390625 0.4150390625Q10.13671875 1.8359375 10.13671875 4.27734375ZM8.33984375 3.75Q8.3203125 2.275390625 7.5146484375 1.396484375Q6.708984375 0.517578125 5.380859375 0.517578125Q3.876953125 0.517578125 2.9736328125 1.3671875Q2.0703125 2.216796875 1.93359375 3.759765625Z'/>",
-    'f': "<path d='M6.962890625 -5.0V-3.505859375H5.244140625Q4.27734375 -3.505859375 3.9013671875 -3.115234375Q3.525390625 -2.724609375 3.525390625 -1.708984375V-0.7421875H6.484375V0.654296875H3.525390625V10.1953125H1.71875V0.654296875H0.0V-0.7421875H1.71875V-1.50390625Q1.71875 -3.330078125 2.568359375 -4.1650390625Q3.41796875 -5.0 5.263671875 -5.0Z'/>",
-    'g': "<path d='M7.978515625 4.599609375Q7.978515625 2.646484375 7.1728515625 1.572265625Q6.3671875 0.498046875 4.912109375 0.498046875Q3.466796875 0.498046875 2.6611328125 1.572265625Q1.85546875 2.646484375 1.85546875 4.599609375Q1.85546875 6.54296875 2.6611328125 7.6171875Q3.466796875 8.69140625 4.912109375 8.69140625Q6.3671875 8.69140625 7.1728515625 7.6171875Q7.978515625 6.54296875 7.978515625 4.599609375ZM9.775390625 8.837890625Q9.775390625 11.630859375 8.53515625 12.9931640625Q7.294921875 14.35546875 4.736328125 14.35546875Q3.7890625 14.35546875 2.94921875 14.2138671875Q2.109375 14.072265625 1.318359375 13.779296875V12.03125Q2.109375 12.4609375 2.880859375 12.666015625Q3.65234375 12.87109375 4.453125 12.87109375Q6.220703125 12.87109375 7.099609375 11.9482421875Q7.978515625 11.025390625 7.978515625 9.16015625V8.271484375Q7.421875 9.23828125 6.552734375 9.716796875Q5.68359375 10.1953125 4.47265625 10.1953125Q2.4609375 10.1953125 1.23046875 8.662109375Q0.0 7.12890625 0.0 4.599609375Q0.0 2.060546875 1.23046875 0.52734375Q2.4609375 -1.005859375 4.47265625 -1.005859375Q5.68359375 -1.005859375 6.552734375 -0.52734375Q7.421875 -0.048828125 7.978515625 0.91796875V-0.7421875H9.775390625Z'/>",
-    'h': "<path d='M9.16015625 3.59375V10.1953125H7.36328125V3.65234375Q7.36328125 2.099609375 6.7578125 1.328125Q6.15234375 0.556640625 4.94140625 0.556640625Q3.486328125 0.556640625 2.646484375 1.484375Q1.806640625 2.412109375 1.806640625 4.013671875V10.1953125H0.0V-5.0H1.806640625V0.95703125Q2.451171875 -0.029296875 3.3251953125 -0.517578125Q4.19921875 -1.005859375 5.341796875 -1.005859375Q7.2265625 -1.005859375 8.193359375 0.1611328125Q9.16015625 1.328125 9.16015625 3.59375Z'/>",
-    'i': "<path d='M0.0 -0.7421875H1.796875V10.1953125H0.0ZM0.0 -5.0H1.796875V-2.724609375H0.0Z'/>",
-    'j': "<path d='M2.24609375 -0.7421875H4.04296875V10.390625Q4.04296875 12.48046875 3.2470703125 13.41796875Q2.451171875 14.35546875 0.68359375 14.35546875H0.0V12.83203125H0.478515625Q1.50390625 12.83203125 1.875 12.3583984375Q2.24609375 11.884765625 2.24609375 10.390625ZM2.24609375 -5.0H4.04296875V-2.724609375H2.24609375Z'/>",
-    '1': "<path d='M0.283203125 8.53515625H3.505859375V-2.587890625L0.0 -1.884765625V-3.681640625L3.486328125 -4.384765625H5.458984375V8.53515625H8.681640625V10.1953125H0.283203125Z'/>",
-    '2': "<path d='M2.373046875 8.53515625H9.2578125V10.1953125H0.0V8.53515625Q1.123046875 7.373046875 3.0615234375 5.4150390625Q5.0 3.45703125 5.498046875 2.890625Q6.4453125 1.826171875 6.8212890625 1.0888671875Q7.197265625 0.3515625 7.197265625 -0.361328125Q7.197265625 -1.5234375 6.3818359375 -2.255859375Q5.56640625 -2.98828125 4.2578125 -2.98828125Q3.330078125 -2.98828125 2.2998046875 -2.666015625Q1.26953125 -2.34375 0.09765625 -1.689453125V-3.681640625Q1.2890625 -4.16015625 2.32421875 -4.404296875Q3.359375 -4.6484375 4.21875 -4.6484375Q6.484375 -4.6484375 7.83203125 -3.515625Q9.1796875 -2.3828125 9.1796875 -0.869140625Q9.1796875 0.341796875 8.564453125 1.1767578125Q7.87109375 2.01171875 6.591796875 2.333984375Z'/>",
-    '3': "<path d='M6.591796875 2.333984375Q8.0078125 2.63671875 8.8037109375 3.59375Q9.599609375 4.55078125 9.599609375 5.95703125Q9.599609375 8.115234375 8.115234375 9.296875Q6.630859375 10.478515625 3.896484375 10.478515625Q2.978515625 10.478515625 2.0068359375 10.2978515625Q1.03515625 10.1171875 0.0 9.755859375V7.8515625Q0.8203125 8.330078125 1.796875 8.57421875Q2.7734375 8.818359375 3.837890625 8.818359375Q5.693359375 8.818359375 6.6650390625 8.0859375Q7.63671875 7.353515625 7.63671875 5.95703125Q7.63671875 4.66796875 6.7333984375 3.9404296875Q5.830078125 3.212890625 4.21875 3.212890625H2.51953125V1.591796875H4.296875Q5.751953125 1.591796875 6.5234375 1.0107421875Q7.294921875 0.4296875 7.294921875 -0.6640625Q7.294921875 -1.787109375 6.4990234375 -2.3876953125Q5.703125 -2.98828125 4.21875 -2.98828125Q3.408203125 -2.98828125 2.48046875 -2.8125Q1.552734375 -2.63671875 0.439453125 -2.265625V-4.0234375Q1.5625 -4.3359375 2.5439453125 -4.4921875Q3.525390625 -4.6484375 4.39453125 -4.6484375Q6.640625 -4.6484375 7.94921875 -3.6279296875Q9.2578125 -2.607421875 9.2578125 -0.869140625Q9.2578125 0.341796875 8.564453125 1.1767578125Q7.87109375 2.01171875 6.591796875 2.333984375Z'/>",
-    '4': "<path d='M6.58203125 -2.666015625 1.6015625 5.1171875H6.58203125ZM6.064453125 -4.384765625H8.544921875V5.1171875H10.625V6.7578125H8.544921875V10.1953125H6.58203125V6.7578125H0.0V4.853515625Z'/>",
-    '5': "<path d='M0.615234375 -4.384765625H8.359375V-2.724609375H2.421875V0.849609375Q2.8515625 0.703125 3.28125 0.6298828125Q3.7109375 0.556640625 4.140625 0.556640625Q6.58203125 0.556640625 8.0078125 1.89453125Q9.43359375 3.232421875 9.43359375 5.517578125Q9.43359375 7.87109375 7.96875 9.1748046875Q6.50390625 10.478515625 3.837890625 10.478515625Q2.919921875 10.478515625 1.9677734375 10.322265625Q1.015625 10.166015625 0.0 9.853515625V7.87109375Q0.87890625 8.349609375 1.81640625 8.583984375Q2.75390625 8.818359375 3.798828125 8.818359375Q5.48828125 8.818359375 6.474609375 7.9296875Q7.4609375 7.041015625 7.4609375 5.517578125Q7.4609375 3.994140625 6.474609375 3.10546875Q5.48828125 2.216796875 3.798828125 2.216796875Q3.0078125 2.216796875 2.2216796875 2.392578125Q1.435546875 2.568359375 0.615234375 2.939453125Z'/>",
-    '6': "<path d='M5.205078125 2.119140625Q3.876953125 2.119140625 3.1005859375 3.02734375Q2.32421875 3.935546875 2.32421875 5.517578125Q2.32421875 7.08984375 3.1005859375 8.0029296875Q3.876953125 8.916015625 5.205078125 8.916015625Q6.533203125 8.916015625 7.3095703125 8.0029296875Q8.0859375 7.08984375 8.0859375 5.517578125Q8.0859375 3.935546875 7.3095703125 3.02734375Q6.533203125 2.119140625 5.205078125 2.119140625ZM9.12109375 -4.0625V-2.265625Q8.37890625 -2.6171875 7.6220703125 -2.802734375Q6.865234375 -2.98828125 6.123046875 -2.98828125Q4.169921875 -2.98828125 3.1396484375 -1.669921875Q2.109375 -0.3515625 1.962890625 2.314453125Q2.5390625 1.46484375 3.408203125 1.0107421875Q4.27734375 0.556640625 5.322265625 0.556640625Q7.51953125 0.556640625 8.7939453125 1.8896484375Q10.068359375 3.22265625 10.068359375 5.517578125Q10.068359375 7.763671875 8.740234375 9.12109375Q7.412109375 10.478515625 5.205078125 10.478515625Q2.67578125 10.478515625 1.337890625 8.5400390625Q0.0 6.6015625 0.0 2.919921875Q0.0 -0.537109375 1.640625 -2.5927734375Q3.28125 -4.6484375 6.044921875 -4.6484375Q6.787109375 -4.6484375 7.5439453125 -4.501953125Q8.30078125 -4.35546875 9.12109375 -4.0625Z'/>",
-    '7': "<path d='M0.0 -4.384765625H9.375V-3.544921875L4.08203125 10.1953125H2.021484375L7.001953125 -2.724609375H0.0Z'/>",
-    '8': "<path d='M5.0 3.271484375Q3.59375 3.271484375 2.7880859375 4.0234375Q1.982421875 4.775390625 1.982421875 6.09375Q1.982421875 7.412109375 2.7880859375 8.1640625Q3.59375 8.916015625 5.0 8.916015625Q6.40625 8.916015625 7.216796875 8.1591796875Q8.02734375 7.40234375 8.02734375 6.09375Q8.02734375 4.775390625 7.2216796875 4.0234375Q6.416015625 3.271484375 5.0 3.271484375ZM3.02734375 2.431640625Q1.7578125 2.119140625 1.0498046875 1.25Q0.341796875 0.380859375 0.341796875 -0.869140625Q0.341796875 -2.6171875 1.5869140625 -3.6328125Q2.83203125 -4.6484375 5.0 -4.6484375Q7.177734375 -4.6484375 8.41796875 -3.6328125Q9.658203125 -2.6171875 9.658203125 -0.869140625Q9.658203125 0.380859375 8.9501953125 1.25Q8.2421875 2.119140625 6.982421875 2.431640625Q8.408203125 2.763671875 9.2041015625 3.73046875Q10.0 4.697265625 10.0 6.09375Q10.0 8.212890625 8.7060546875 9.345703125Q7.412109375 10.478515625 5.0 10.478515625Q2.587890625 10.478515625 1.2939453125 9.345703125Q0.0 8.212890625 0.0 6.09375Q0.0 4.697265625 0.80078125 3.73046875Q1.6015625 2.763671875 3.02734375 2.431640625ZM2.3046875 -0.68359375Q2.3046875 0.44921875 3.0126953125 1.083984375Q3.720703125 1.71875 5.0 1.71875Q6.26953125 1.71875 6.9873046875 1.083984375Q7.705078125 0.44921875 7.705078125 -0.68359375Q7.705078125 -1.81640625 6.9873046875 -2.451171875Q6.26953125 -3.0859375 5.0 -3.0859375Q3.720703125 -3.0859375 3.0126953125 -2.451171875Q2.3046875 -1.81640625 2.3046875 -0.68359375Z'/>",
-    '9': "<path d='M0.9375 9.892578125V8.095703125Q1.6796875 8.447265625 2.44140625 8.6328125Q3.203125 8.818359375 3.935546875 8.818359375Q5.888671875 8.818359375 6.9189453125 7.5048828125Q7.94921875 6.19140625 8.095703125 3.515625Q7.529296875 4.35546875 6.66015625 4.8046875Q5.791015625 5.25390625 4.736328125 5.25390625Q2.548828125 5.25390625 1.2744140625 3.9306640625Q0.0 2.607421875 0.0 0.3125Q0.0 -1.93359375 1.328125 -3.291015625Q2.65625 -4.6484375 4.86328125 -4.6484375Q7.392578125 -4.6484375 8.7255859375 -2.7099609375Q10.05859375 -0.771484375 10.05859375 2.919921875Q10.05859375 6.3671875 8.4228515625 8.4228515625Q6.787109375 10.478515625 4.0234375 10.478515625Q3.28125 10.478515625 2.51953125 10.33203125Q1.7578125 10.185546875 0.9375 9.892578125ZM4.86328125 3.7109375Q6.19140625 3.7109375 6.9677734375 2.802734375Q7.744140625 1.89453125 7.744140625 0.3125Q7.744140625 -1.259765625 6.9677734375 -2.1728515625Q6.19140625 -3.0859375 4.86328125 -3.0859375Q3.53515625 -3.0859375 2.7587890625 -2.1728515625Q1.982421875 -1.259765625 1.982421875 0.3125Q1.982421875 1.89453125 2.7587890625 2.802734375Q3.53515625 3.7109375 4.86328125 3.7109375Z'/>",
-    '0': "<path d='M5.0390625 -3.0859375Q3.515625 -3.0859375 2.7490234375 -1.5869140625Q1.982421875 -0.087890625 1.982421875 2.919921875Q1.982421875 5.91796875 2.7490234375 7.4169921875Q3.515625 8.916015625 5.0390625 8.916015625Q6.572265625 8.916015625 7.3388671875 7.4169921875Q8.10546875 5.91796875 8.10546875 2.919921875Q8.10546875 -0.087890625 7.3388671875 -1.5869140625Q6.572265625 -3.0859375 5.0390625 -3.0859375ZM5.0390625 -4.6484375Q7.490234375 -4.6484375 8.7841796875 -2.7099609375Q10.078125 -0.771484375 10.078125 2.919921875Q10.078125 6.6015625 8.7841796875 8.5400390625Q7.490234375 10.478515625 5.0390625 10.478515625Q2.587890625 10.478515625 1.2939453125 8.5400390625Q0.0 6.6015625 0.0 2.919921875Q0.0 -0.771484375 1.2939453125 -2.7099609375Q2.587890625 -4.6484375 5.0390625 -4.6484375Z'/>",
-    '10': "<path d='M-0.6787109375 8.53515625H2.5439453125V-2.587890625L-0.9619140625 -1.884765625V-3.681640625L2.5244140625 -4.384765625H4.4970703125V8.53515625H7.7197265625V10.1953125H-0.6787109375ZM15.9228515625 -3.0859375Q14.3994140625 -3.0859375 13.6328125 -1.5869140625Q12.8662109375 -0.087890625 12.8662109375 2.919921875Q12.8662109375 5.91796875 13.6328125 7.4169921875Q14.3994140625 8.916015625 15.9228515625 8.916015625Q17.4560546875 8.916015625 18.22265625 7.4169921875Q18.9892578125 5.91796875 18.9892578125 2.919921875Q18.9892578125 -0.087890625 18.22265625 -1.5869140625Q17.4560546875 -3.0859375 15.9228515625 -3.0859375ZM15.9228515625 -4.6484375Q18.3740234375 -4.6484375 19.66796875 -2.7099609375Q20.9619140625 -0.771484375 20.9619140625 2.919921875Q20.9619140625 6.6015625 19.66796875 8.5400390625Q18.3740234375 10.478515625 15.9228515625 10.478515625Q13.4716796875 10.478515625 12.177734375 8.5400390625Q10.8837890625 6.6015625 10.8837890625 2.919921875Q10.8837890625 -0.771484375 12.177734375 -2.7099609375Q13.4716796875 -4.6484375 15.9228515625 -4.6484375Z'/>",
-
-}
-
-def get_coord_svg(label, x, y, size, color, opacity=1.0):
-    """Return an SVG <g> element for a coordinate label using a path from COORD_SVG_PATHS."""
-    if label not in COORD_SVG_PATHS:
-        return None
-    group = ET.Element("g", {
-        "transform": f"translate({x},{y}) scale({size/32.0})",
-        "fill": color,
-        "stroke": color,
-        "opacity": str(opacity),
-    })
-    group.append(ET.fromstring(COORD_SVG_PATHS[label]))
-    return group
-
-
-def board(css, board=None, orientation=True, flipped=False, check=None, lastmove=None, arrows=(), squares=None, width=None, height=None, colors=None, coordinates=False, borders=False, background_image=None, rotate_opponent=False):
-    orientation ^= flipped
-    inner_border = 1 if borders and coordinates else 0
-    outer_border = 1 if borders else 0
-    margin = 15 if coordinates else 0
-    # full_size = 2 * outer_border + 2 * margin + 2 * inner_border + 8 * SQUARE_SIZE
-
-    svg = _svg(board.cols * SQUARE_SIZE, board.rows * SQUARE_SIZE, width, height)
-    if colors:
-        ET.SubElement(svg, "style").text = _colors_to_css(colors)
-
-    if lastmove:
-        lastmove_from = (board.rows - square_rank(lastmove.from_square) - 1, square_file(lastmove.from_square))
-        lastmove_to = (board.rows - square_rank(lastmove.to_square) - 1 , square_file(lastmove.to_square))
-
-    defs = ET.SubElement(svg, "defs")
-    if board:
-        for symbol in SVG_PIECES[css]:
-            defs.append(ET.fromstring(SVG_PIECES[css][symbol]))
-
-    if squares:
-        defs.append(ET.fromstring(XX))
-
-    if check is not None:
-        defs.append(ET.fromstring(CHECK_GRADIENT))
-        check_rank_index = board.rows - square_rank(check) - 1
-        check_file_index = square_file(check)
-
-    # Render board background image if provided
-    if background_image:
-        if background_image.lower().endswith('.svg'):
-            # Embed SVG background directly
-            bg_path = os.path.join('pychess-variants/static/images/board', background_image)
-            try:
-                with open(bg_path, 'r', encoding='utf-8') as f:
-                    bg_svg = f.read()
-                # Remove XML declaration if present
-                if bg_svg.startswith('<?xml'):
-                    bg_svg = bg_svg.split('?>', 1)[-1]
-                # Parse the SVG and extract width/height or viewBox
-                bg_tree = ET.fromstring(bg_svg)
-                if bg_tree.tag.endswith('svg'):
-                    width = bg_tree.get('width')
-                    height = bg_tree.get('height')
-                    viewBox = bg_tree.get('viewBox')
-                    if width and height:
-                        try:
-                            width_val = float(width.replace('px',''))
-                            height_val = float(height.replace('px',''))
-                        except Exception:
-                            width_val = board.cols * SQUARE_SIZE
-                            height_val = board.rows * SQUARE_SIZE
-                    elif viewBox:
-                        parts = viewBox.strip().split()
-                        width_val = float(parts[2])
-                        height_val = float(parts[3])
-                    else:
-                        width_val = board.cols * SQUARE_SIZE
-                        height_val = board.rows * SQUARE_SIZE
-                    # Remove <svg> wrapper, keep children
-                    bg_inner = list(bg_tree)
-                    bg_group = ET.Element('g')
-                    for elem in bg_inner:
-                        bg_group.append(elem)
-                    scale_x = (board.cols * SQUARE_SIZE) / width_val
-                    scale_y = (board.rows * SQUARE_SIZE) / height_val
-                    bg_group.set('transform', f'translate({margin}, {margin}) scale({scale_x}, {scale_y})')
-                    svg.insert(1, bg_group)
-                else:
-                    # fallback: insert as a group
-                    bg_elem = ET.fromstring(f'<g>{bg_svg}</g>')
-                    svg.insert(1, bg_elem)
-            except Exception as e:
-                print(f"ERROR: Could not embed SVG background: {e}")
-        else:
-            # Use <image> for PNG/JPG, embed as data URI
-            import base64
-            img_path = os.path.join('pychess-variants/static/images/board', background_image)
-            try:
-                with open(img_path, 'rb') as img_file:
-                    img_bytes = img_file.read()
-                ext = os.path.splitext(background_image)[1].lower()
-                if ext == '.jpg' or ext == '.jpeg':
-                    mime = 'image/jpeg'
-                elif ext == '.png':
-                    mime = 'image/png'
-                else:
-                    mime = 'application/octet-stream'
-                data_uri = f"data:{mime};base64," + base64.b64encode(img_bytes).decode('ascii')
-                ET.SubElement(svg, "image", {
-                    "{http://www.w3.org/1999/xlink}href": data_uri,
-                    "x": str(margin),
-                    "y": str(margin),
-                    "width": str(board.cols * SQUARE_SIZE),
-                    "height": str(board.rows * SQUARE_SIZE),
-                    "preserveAspectRatio": "none"
-                })
-            except Exception as e:
-                print(f"ERROR: Could not embed PNG/JPG background: {e}")
-        render_squares = False
-    else:
-        render_squares = True
-
-    # Adjust SVG viewBox and size to include margin for coordinates
-    if coordinates:
-        total_width = board.cols * SQUARE_SIZE + 2 * margin
-        total_height = board.rows * SQUARE_SIZE + 2 * margin
-        svg.set("viewBox", f"0 0 {total_width} {total_height}")
-        if width is not None:
-            svg.set("width", str(total_width))
-        if height is not None:
-            svg.set("height", str(total_height))
-
-    # Render board squares only if not using a background image
-    if render_squares:
-        for y_index in range(board.rows):
-            for x_index in range(board.cols):
-                if orientation:
-                    display_row = y_index
-                    display_col = x_index
-                else:
-                    display_row = board.rows - y_index - 1
-                    display_col = board.cols - x_index - 1
-                x = (x_index) * SQUARE_SIZE + (margin if coordinates else 0)
-                y = (y_index) * SQUARE_SIZE + (margin if coordinates else 0)
-
-                cls = ["square", "light" if display_col % 2 == display_row % 2 else "dark"]
-                if lastmove and (display_row, display_col) in (lastmove_from, lastmove_to):
-                    cls.append("lastmove")
-                fill_color = DEFAULT_COLORS[" ".join(cls)]
-
-                ET.SubElement(svg, "rect", {
-                    "x": str(x),
-                    "y": str(y),
-                    "width": str(SQUARE_SIZE),
-                    "height": str(SQUARE_SIZE),
-                    "class": " ".join(cls),
-                    "stroke": "none",
-                    "fill": fill_color,
-                })
-
-                # Render selected squares.
-                if squares and (display_row, display_col) in parse_squares(board, squares):
-                    ET.SubElement(svg, "use", _attrs({
-                        "href": "#xx",
-                        "xlink:href": "#xx",
-                        "x": x,
-                        "y": y,
-                    }))
-
-    # Render coordinates using SVG path glyphs for robustness
-    if coordinates:
-        coord_size = int(margin * 0.9)
-        text_color = DEFAULT_COLORS["coord"]
-        offset = 5
-        # Center coordinates in the margin area for files (bottom/top)
-        for file_index in range(board.cols):
-            index = file_index if orientation else board.cols - file_index - 1
-            file_char = pychess.COORDS[coordinates][0](index, board.cols)
-            x = file_index * SQUARE_SIZE + margin + SQUARE_SIZE // 2 - coord_size // 2 + offset
-            y_top = margin // 2 - coord_size // 2 + offset
-            y_bottom = margin + board.rows * SQUARE_SIZE + margin // 2 - coord_size // 2 + offset
-            for y in (y_top, y_bottom):
-                coord_g = get_coord_svg(file_char, x, y, coord_size, text_color)
-                if coord_g is not None:
-                    svg.append(coord_g)
-        # Center coordinates in the margin area for ranks (left/right)
-        for rank_index in range(board.rows):
-            index = rank_index if orientation else board.rows - rank_index - 1
-            rank_char = pychess.COORDS[coordinates][1](index, board.rows)
-            y = rank_index * SQUARE_SIZE + margin + SQUARE_SIZE // 2 - coord_size // 2 + offset
-            x_left = margin // 2 - coord_size // 2 + offset
-            x_right = margin + board.cols * SQUARE_SIZE + margin // 2 - coord_size // 2 + offset
-            for x in (x_left, x_right):
-                coord_g = get_coord_svg(rank_char, x, y, coord_size, text_color)
-                if coord_g is not None:
-                    svg.append(coord_g)
-    # Render pieces
-    if board is not None:
-        for y_index in range(board.rows):
-            for x_index in range(board.cols):
-                if orientation:
-                    display_row = y_index
-                    display_col = x_index
-                else:
-                    display_row = board.rows - y_index - 1
-                    display_col = board.cols - x_index - 1
-                x = x_index * SQUARE_SIZE + (margin if coordinates else 0)
-                y = y_index * SQUARE_SIZE + (margin if coordinates else 0)
-                piece = board.piece_at(display_row, display_col)
-                if piece:
-                    # Render check mark.
-                    if (check is not None) and check_file_index == display_col and check_rank_index == display_row:
-                        ET.SubElement(svg, "rect", _attrs({
-                            "x": x,
-                            "y": y,
-                            "width": SQUARE_SIZE,
-                            "height": SQUARE_SIZE,
-                            "class": "check",
-                            "fill": "url(#check_gradient)",
-                        }))
-
-                    color = pychess.COLOR_NAMES[piece.color]
-                    href = "#%s-%s-piece" % (color, piece.symbol)
-                    # Apply 180-degree rotation to opponent pieces if requested
-                    transform = f"translate({x}, {y})"
-                    if rotate_opponent:
-                        # Determine if this is an opponent piece (relative to orientation)
-                        is_opponent = (piece.color != (1 if orientation else 0))
-                        if is_opponent:
-                            # Center of the square
-                            cx = x + SQUARE_SIZE / 2
-                            cy = y + SQUARE_SIZE / 2
-                            transform = f"translate({cx},{cy}) rotate(180) translate({-SQUARE_SIZE/2},{-SQUARE_SIZE/2})"
-                    ET.SubElement(svg, "use", {
-                        "xlink:href": href,
-                        "transform": transform,
-                    })
-
-    # Render arrows.
-    for arrow in arrows:
-        try:
-            tail, head, color = arrow.tail, arrow.head, arrow.color  # type: ignore
-        except AttributeError:
-            tail, head = arrow  # type: ignore
-            color = "green"
-
-        try:
-            color, opacity = _select_color(colors, " ".join(["arrow", color]))
-        except KeyError:
-            opacity = 1.0
-
-        tail_file = square_file(tail)
-        tail_rank = square_rank(tail)
-        head_file = square_file(head)
-        head_rank = square_rank(head)
-
-        x_corr = board.cols - 0.5
-        y_corr = board.rows - 0.5
-
-        xtail = outer_border + (margin if coordinates else 0) + inner_border + (tail_file + 0.5 if orientation else x_corr - tail_file) * SQUARE_SIZE
-        ytail = outer_border + (margin if coordinates else 0) + inner_border + (y_corr - tail_rank if orientation else tail_rank + 0.5) * SQUARE_SIZE
-        xhead = outer_border + (margin if coordinates else 0) + inner_border + (head_file + 0.5 if orientation else x_corr - head_file) * SQUARE_SIZE
-        yhead = outer_border + (margin if coordinates else 0) + inner_border + (y_corr - head_rank if orientation else head_rank + 0.5) * SQUARE_SIZE
-
-        if (head_file, head_rank) == (tail_file, tail_rank):
-            ET.SubElement(svg, "circle", _attrs({
-                "cx": xhead,
-                "cy": yhead,
-                "r": SQUARE_SIZE * 0.93 / 2,
-                "stroke-width": SQUARE_SIZE * 0.07,
-                "stroke": color,
-                "opacity": opacity if opacity < 1.0 else None,
-                "fill": "none",
-                "class": "circle",
-            }))
-        else:
-            marker_size = 0.6 * SQUARE_SIZE
-            marker_margin = 0.1 * SQUARE_SIZE
-
-            dx, dy = xhead - xtail, yhead - ytail
-            hypot = math.hypot(dx, dy)
-
-            shaft_x = xhead - dx * (marker_size + marker_margin) / hypot
-            shaft_y = yhead - dy * (marker_size + marker_margin) / hypot
-
-            xtip = xhead - dx * marker_margin / hypot
-            ytip = yhead - dy * marker_margin / hypot
-
-            ET.SubElement(svg, "line", _attrs({
-                "x1": xtail,
-                "y1": ytail,
-                "x2": shaft_x,
-                "y2": shaft_y,
-                "stroke": color,
-                "opacity": opacity if opacity < 1.0 else None,
-                "stroke-width": SQUARE_SIZE * 0.2,
-                "stroke-linecap": "butt",
-                "class": "arrow",
-            }))
-
-            marker = [(xtip, ytip),
-                      (shaft_x + dy * 0.5 * marker_size / hypot,
-                       shaft_y - dx * 0.5 * marker_size / hypot),
-                      (shaft_x - dy * 0.5 * marker_size / hypot,
-                       shaft_y + dx * 0.5 * marker_size / hypot)]
-
-            ET.SubElement(svg, "polygon", _attrs({
-                "points": " ".join(f"{x},{y}" for x, y in marker),
-                "fill": color,
-                "opacity": opacity if opacity < 1.0 else None,
-                "class": "arrow",
-            }))
-
-    return SvgWrapper(ET.tostring(svg).decode("utf-8"))
+import pychess
+import base64
+import concurrent.futures
+import functools
+import glob
+import gzip
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import time
+from typing import Dict, Tuple, Union
+
+import xml.etree.ElementTree as ET
+
+
+SQUARE_SIZE = 45
+MARGIN = 20
+
+SVG_PIECES = {}
+SVG_PATH_PIECES = {}
+SVG_PIECE_ELEMENTS = {}
+
+# Sizes of the piece definitions of each piece set before and after optimization
+PIECE_STATS = {}
+
+# Decimals of piece coordinates in a square of SQUARE_SIZE, None keeps full precision
+PIECE_PRECISION = 2
+
+
+XX = """<g id="xx"><path d="M35.865 9.135a1.89 1.89 0 0 1 0 2.673L25.173 22.5l10.692 10.692a1.89 1.89 0 0 1 0 2.673 1.89 1.89 0 0 1-2.673 0L22.5 25.173 11.808 35.865a1.89 1.89 0 0 1-2.673 0 1.89 1.89 0 0 1 0-2.673L19.827 22.5 9.135 11.808a1.89 1.89 0 0 1 0-2.673 1.89 1.89 0 0 1 2.673 0L22.5 19.827 33.192 9.135a1.89 1.89 0 0 1 2.673 0z" fill="#000" stroke="#fff" stroke-width="1.688"/></g>"""  # noqa: E501
+
+CHECK_GRADIENT = """<radialGradient id="check_gradient" r="0.5"><stop offset="0%" stop-color="#ff0000" stop-opacity="1.0" /><stop offset="50%" stop-color="#e70000" stop-opacity="1.0" /><stop offset="100%" stop-color="#9e0000" stop-opacity="0.0" /></radialGradient>"""  # noqa: E501
+
+DEFAULT_COLORS = {
+    "square light": "#f0d9b5",
+    "square dark": "#b58863",
+    "square dark lastmove": "#aaa23b",
+    "square light lastmove": "#cdd16a",
+    "margin": "#212121",
+    "inner border": "#111",
+    "outer border": "#111",
+    "coord": "#333333",
+    "arrow green": "#15781B80",
+    "arrow red": "#88202080",
+    "arrow yellow": "#e68f00b3",
+    "arrow blue": "#00308880",
+    "arrow white": "#FFFFFF80",
+    "arrow black": "#00000080",
+}
+
+
+STATIC_PATH = "pychess-variants/static/"
+
+ASSET_VERSIONS = {}
+
+# Static assets indexed by scan_assets(): path relative to STATIC_PATH ->
+# (absolute path, size, modification time in ns)
+MANIFEST = {}
+
+MANIFEST_DIRS = ("piece", os.path.join("images", "pieces"), os.path.join("images", "board"))
+
+_manifest_scanned = False
+
+# Missing or unusable assets with the time they were found missing. Keys
+# are paths relative to STATIC_PATH for files, and (css, symbol) for pieces.
+MISSING = {}
+
+# Seconds after which missing assets are looked up again, None never looks them up again
+MISSING_TTL = None
+
+# Number of missing assets remembered, the oldest are forgotten first
+MAX_MISSING = 4096
+
+_next_expiry = float("inf")
+
+
+def _set_missing(key, error=None):
+    global _next_expiry
+    if error is not None:
+        print("ERROR: %s" % error)
+    now = time.monotonic()
+    MISSING.pop(key, None)
+    MISSING[key] = now
+    if MISSING_TTL is not None:
+        _next_expiry = min(_next_expiry, now + MISSING_TTL)
+
+
+def _forget_missing(key):
+    """Forgets a missing asset and the placeholders stored for it."""
+    del MISSING[key]
+    if isinstance(key, tuple):
+        css, symbol = key
+        if SVG_PIECES.get(css, {}).get(symbol) == "":
+            del SVG_PIECES[css][symbol]
+        SVG_PIECE_ELEMENTS.pop(key, None)
+    else:
+        ASSET_VERSIONS.pop(key, None)
+        if key.startswith("piece" + os.sep) and key.endswith(".css"):
+            css = key[len("piece" + os.sep):-len(".css")]
+            SVG_PIECES.pop(css, None)
+            SVG_PATH_PIECES.pop(css, None)
+            PIECE_STATS.pop(css, None)
+
+
+def expire_missing():
+    """
+    Forgets assets that were found missing more than :data:`MISSING_TTL`
+    seconds ago, so that they are looked up again on their next use, and
+    the oldest beyond :data:`MAX_MISSING`, so that requests naming
+    nonexistent assets cannot grow memory without bound. This is cheap
+    enough to be called for every request.
+    """
+    global _next_expiry
+    while len(MISSING) > MAX_MISSING:
+        _forget_missing(next(iter(MISSING)))
+    if MISSING_TTL is None or time.monotonic() < _next_expiry:
+        return
+    now = time.monotonic()
+    _next_expiry = float("inf")
+    rescan = False
+    for key, since in list(MISSING.items()):
+        if now - since < MISSING_TTL:
+            _next_expiry = min(_next_expiry, since + MISSING_TTL)
+            continue
+        _forget_missing(key)
+        rescan = True
+    if rescan and _manifest_scanned:
+        scan_assets()
+
+
+def scan_assets():
+    """
+    Indexes the piece sets, piece images and board backgrounds in
+    :data:`STATIC_PATH` into :data:`MANIFEST`, so that rendering only looks
+    them up there instead of probing the file system.
+    """
+    global _manifest_scanned
+    manifest = {}
+    for directory in MANIFEST_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(STATIC_PATH, directory)):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                manifest[os.path.relpath(path, STATIC_PATH)] = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    MANIFEST.clear()
+    MANIFEST.update(manifest)
+    _manifest_scanned = True
+
+
+def static_file(path):
+    """
+    Returns the path of a static asset given relative to :data:`STATIC_PATH`,
+    or ``None`` if it does not exist.
+    """
+    if _manifest_scanned:
+        asset = MANIFEST.get(path)
+        return asset[0] if asset is not None else None
+    full_path = os.path.join(STATIC_PATH, path)
+    return full_path if os.path.isfile(full_path) else None
+
+
+def manifest():
+    """Lists the available piece sets and board backgrounds with their sizes and modification times."""
+    if not _manifest_scanned:
+        scan_assets()
+
+    def entry(path):
+        _, size, mtime_ns = MANIFEST[path]
+        return {"size": size, "mtime": mtime_ns / 1e9}
+
+    board_path = os.path.join("images", "board") + os.sep
+    return {
+        "piece_sets": {css: entry(os.path.join("piece", css + ".css")) for css in piece_sets()},
+        "backgrounds": {path[len(board_path):].replace(os.sep, "/"): entry(path) for path in sorted(MANIFEST) if path.startswith(board_path)},
+    }
+
+
+def asset_version(path):
+    """
+    Returns a short version string for the static asset at *path* (relative
+    to :data:`STATIC_PATH`). The version changes when the file is modified
+    and is ``"0"`` for missing files. It is determined once per process for
+    existing files, just like the assets themselves are loaded only once.
+    Versions of missing files are not remembered, so that requests naming
+    nonexistent files do not grow :data:`ASSET_VERSIONS`.
+    """
+    try:
+        return ASSET_VERSIONS[path]
+    except KeyError:
+        pass
+
+    if _manifest_scanned:
+        asset = MANIFEST.get(path)
+        if asset is None:
+            return "0"
+        version = "%x-%x" % (asset[2], asset[1])
+    else:
+        try:
+            stat = os.stat(os.path.join(STATIC_PATH, path))
+        except OSError:
+            return "0"
+        version = "%x-%x" % (stat.st_mtime_ns, stat.st_size)
+    ASSET_VERSIONS[path] = version
+    return version
+
+
+def piece_set_version(css):
+    return asset_version(os.path.join("piece", css + ".css"))
+
+
+def get_svg_pieces_from_css(css):
+    SVG_PIECES[css] = {}
+    SVG_PATH_PIECES[css] = {}
+    PIECE_STATS[css] = [0, 0]
+    css_path = static_file(os.path.join("piece", css + ".css"))
+    if css_path is None:
+        _set_missing(os.path.join("piece", css + ".css"), "FileNotFoundError %s" % os.path.join(STATIC_PATH, "piece", css + ".css"))
+        return
+    with open(css_path) as css_file:
+        color, symbol, url = "", "", ""
+        promoted = False
+        for line in css_file:
+            if line.strip():
+                if "piece." in line:
+                    color = "white" if ("white" in line or "ally" in line) else "black"
+                    start = line.find("piece.") + 6
+                    end = line.find("-piece")
+                    symbol = line[start:end]
+                    if "promoted" in line:
+                        promoted = True
+                if "url" in line:
+                    start = line.find("url(") + 5
+                    end = line.find(")") - 1
+                    url = line[start:end]
+                if symbol and url:
+                    if color == "white":
+                        letters = list(symbol)
+                        letters[-1] = letters[-1].upper()
+                        symbol = ''.join(letters)
+                    if promoted:
+                        symbol = "p" + symbol
+                    SVG_PATH_PIECES[css][symbol] = url
+                    color, symbol, url = "", "", ""
+                    promoted = False
+
+
+def square_file(square):
+    return ord(square[0]) - 97
+
+
+def square_rank(square):
+    return int(square[1:]) - 1
+
+
+def parse_squares(board, squares):
+    parsed = []
+    for square in squares:
+        parsed.append((board.rows - square_rank(square) - 1, square_file(square)))
+    return parsed
+
+
+def _piece_path(css, symbol):
+    """Returns the path of a piece image relative to :data:`STATIC_PATH`."""
+    return os.path.normpath(os.path.join("piece", css, "..", SVG_PATH_PIECES[css][symbol]))
+
+
+def read_piece_svg(css, piece):
+    symbol = piece.symbol
+    piece_name = "%s-piece" % symbol
+
+    # Unusable pieces are stored as empty definitions, so that they are not
+    # looked up again until they expire.
+    if symbol not in SVG_PATH_PIECES[css]:
+        SVG_PIECES[css][symbol] = ""
+        _set_missing((css, symbol))
+        return
+
+    orig_file = static_file(_piece_path(css, symbol))
+    if orig_file is None:
+        SVG_PIECES[css][symbol] = ""
+        _set_missing((css, symbol), "FileNotFoundError %s" % os.path.join(STATIC_PATH, _piece_path(css, symbol)))
+        return
+
+    if orig_file[-3:] != "svg":
+        SVG_PIECES[css][symbol] = ""
+        _set_missing((css, symbol), "%s is not in .svg format" % orig_file)
+        return
+
+    from lxml import etree  # Not needed when loading from a bundle
+
+    root = etree.parse(orig_file).getroot()
+
+    viewBox = root.get("viewBox")
+    if viewBox is not None:
+        min_x, min_y, width = [float(value) for value in viewBox.replace(",", " ").split()[:3]]
+    else:
+        min_x, min_y, width = 0.0, 0.0, _length(root.get("width"))
+    if not width:
+        SVG_PIECES[css][symbol] = ""
+        _set_missing((css, symbol), "%s referenced in %s.css has no viewBox or width" % (orig_file, css))
+        return
+
+    original = sum(len(etree.tostring(child, encoding="unicode")) for child in root)
+    attrs = _optimize_piece(root, SQUARE_SIZE / width, min_x, min_y, PIECE_PRECISION)
+    content = "".join(etree.tostring(child, encoding="unicode") for child in root)
+    PIECE_STATS[css][0] += original
+    PIECE_STATS[css][1] += len(content)
+
+    head = """<g id="%s-%s">""" % (pychess.COLOR_NAMES[piece.color], piece_name)
+    tail = """</g>"""
+
+    SVG_PIECES[css][symbol] = "%s<g%s>%s</g>%s" % (head, _serialize_attrs(attrs), content, tail)
+
+
+SVG_NS = "http://www.w3.org/2000/svg"
+
+# Namespaces of editor data that does not affect rendering
+EDITOR_NAMESPACES = (
+    "http://www.inkscape.org/namespaces/inkscape",
+    "http://sodipodi.sourceforge.net/DTD/",
+    "http://ns.adobe.com/",
+    "http://www.bohemiancoding.com/sketch/ns",
+    "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "http://purl.org/dc/elements/1.1/",
+    "http://creativecommons.org/ns#",
+)
+
+NON_RENDERING_TAGS = ("metadata", "title", "desc")
+
+TEXT_TAGS = ("text", "tspan", "textPath")
+
+# Coordinate attributes of the basic shapes: x/y coordinates (0 by default) and r lengths
+SHAPE_COORDINATES = {
+    "circle": {"cx": "x", "cy": "y", "r": "r"},
+    "ellipse": {"cx": "x", "cy": "y", "rx": "r", "ry": "r"},
+    "rect": {"x": "x", "y": "y", "width": "r", "height": "r", "rx": "r", "ry": "r"},
+    "line": {"x1": "x", "y1": "y", "x2": "x", "y2": "y"},
+}
+
+# Elements whose coordinates can be scaled without a transform
+BAKEABLE_TAGS = ("g", "path", "polygon", "polyline") + tuple(SHAPE_COORDINATES)
+
+# Properties that would have to be scaled as well, or that refer to other elements
+UNBAKEABLE_PROPERTIES = ("transform", "stroke-dasharray", "stroke-dashoffset", "clip-path", "mask", "filter", "marker-start", "marker-mid", "marker-end")
+
+PATH_COMMANDS = "MmZzLlHhVvCcSsQqTtAa"
+
+# Argument kinds of path commands: x/y coordinates, r lengths, a angles and f flags
+PATH_ARGUMENTS = {"M": "xy", "L": "xy", "T": "xy", "H": "x", "V": "y", "C": "xyxyxy", "S": "xyxy", "Q": "xyxy", "A": "rraffxy", "Z": ""}
+
+_NUMBER = r"[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?"
+_PATH_COMMAND = re.compile(r"[\s,]*([%s])" % PATH_COMMANDS)
+_PATH_NUMBER = re.compile(r"[\s,]*(%s)" % _NUMBER)
+_PATH_FLAG = re.compile(r"[\s,]*([01])")
+_PLAIN_NUMBER = re.compile(r"\s*%s\s*$" % _NUMBER)
+
+
+def _local_name(element):
+    namespace, _, name = element.tag.rpartition("}")
+    return name if namespace in ("", "{" + SVG_NS) else None
+
+
+def _strip_piece(root):
+    """
+    Removes comments, editor data, metadata, formatting whitespace and the
+    redundant SVG namespace from a parsed piece SVG.
+    """
+    from lxml import etree
+
+    for element in list(root.iter()):
+        if element is root:
+            continue
+        if not isinstance(element.tag, str) or _local_name(element) in NON_RENDERING_TAGS or element.tag.startswith(tuple("{" + ns for ns in EDITOR_NAMESPACES)):
+            parent = element.getparent()
+            if element.tail and element.tail.strip():
+                previous = element.getprevious()
+                if previous is not None:
+                    previous.tail = (previous.tail or "") + element.tail
+                else:
+                    parent.text = (parent.text or "") + element.tail
+            parent.remove(element)
+    for element in root.iter():
+        for name in list(element.attrib):
+            if name.startswith(tuple("{" + ns for ns in EDITOR_NAMESPACES)):
+                del element.attrib[name]
+        if _local_name(element) not in TEXT_TAGS:
+            if element.text is not None and not element.text.strip():
+                element.text = None
+        parent = element.getparent()
+        if parent is not None and _local_name(parent) not in TEXT_TAGS and element.tail is not None and not element.tail.strip():
+            element.tail = None
+        # Board documents declare the SVG namespace as default namespace
+        if element.tag.startswith("{%s}" % SVG_NS):
+            element.tag = element.tag[len(SVG_NS) + 2:]
+    etree.cleanup_namespaces(root)
+
+
+def _can_bake(root):
+    """Checks whether the content of a piece SVG consists only of untransformed basic shapes."""
+    for element in root.iterdescendants():
+        name = _local_name(element)
+        if name not in BAKEABLE_TAGS:
+            return False
+        style = element.get("style", "")
+        for prop, value in list(element.attrib.items()) + [tuple(declaration.split(":", 1)) for declaration in style.split(";") if ":" in declaration]:
+            prop = prop.strip()
+            if prop in UNBAKEABLE_PROPERTIES or "url(" in value or (prop == "stroke-width" and _length(value) is None):
+                return False
+        for attr in SHAPE_COORDINATES.get(name, ()):
+            if element.get(attr) is not None and not _PLAIN_NUMBER.match(element.get(attr)):
+                return False
+        try:
+            if name == "path":
+                _parse_path(element.get("d", ""))
+            elif name in ("polygon", "polyline"):
+                _parse_points(element.get("points", ""))
+        except ValueError:
+            return False
+    return True
+
+
+def _round(value, digits):
+    return value if digits is None else round(value, digits)
+
+
+def _number(value, digits):
+    """Formats a number with at most *digits* decimals, without trailing zeros."""
+    text = repr(float(value)) if digits is None else "%.*f" % (digits, value)
+    if "." in text and "e" not in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _parse_path(d):
+    """Splits path data into ``(command, arguments, explicit)`` tuples, where *explicit* is false for implicitly repeated commands."""
+    segments = []
+    pos, command = 0, None
+    while True:
+        match = _PATH_COMMAND.match(d, pos)
+        if match:
+            command, explicit = match.group(1), True
+            pos = match.end()
+        elif not d[pos:].strip():
+            return segments
+        elif command is None or command in "Zz":
+            raise ValueError("invalid path data: %r" % d)
+        else:
+            command, explicit = {"M": "L", "m": "l"}.get(command, command), False
+        args = []
+        for kind in PATH_ARGUMENTS[command.upper()]:
+            match = (_PATH_FLAG if kind == "f" else _PATH_NUMBER).match(d, pos)
+            if match is None:
+                raise ValueError("invalid path data: %r" % d)
+            args.append(float(match.group(1)))
+            pos = match.end()
+        segments.append((command, args, explicit))
+
+
+def _parse_points(points):
+    values = [float(value) for value in re.findall(_NUMBER, points)]
+    if len(values) % 2:
+        raise ValueError("odd number of coordinates: %r" % points)
+    return values
+
+
+def _transform_path(d, scale, dx, dy, digits):
+    """
+    Scales and translates path data and rounds it to *digits* decimals.
+    Relative coordinates are rounded against the rounded current point, so
+    that rounding errors do not add up along the path.
+    """
+    out = []
+    x = y = start_x = start_y = 0.0  # Current point in source coordinates
+    ox = oy = start_ox = start_oy = 0.0  # Current point in rounded output coordinates
+    for command, args, explicit in _parse_path(d):
+        upper = command.upper()
+        relative = command != upper
+        end_x, end_y, end_ox, end_oy = x, y, ox, oy
+        if explicit:
+            out.append(command)
+        for kind, value in zip(PATH_ARGUMENTS[upper], args):
+            if kind == "x":
+                end_x = x + value if relative else value
+                end_ox = _round(end_x * scale + dx, digits)
+                value = end_ox - ox if relative else end_ox
+            elif kind == "y":
+                end_y = y + value if relative else value
+                end_oy = _round(end_y * scale + dy, digits)
+                value = end_oy - oy if relative else end_oy
+            elif kind == "r":
+                value = value * scale
+            text = _number(value, digits)
+            if out and out[-1][-1] not in PATH_COMMANDS and not text.startswith("-"):
+                out.append(" ")
+            out.append(text)
+        if upper == "Z":
+            x, y, ox, oy = start_x, start_y, start_ox, start_oy
+        else:
+            x, y, ox, oy = end_x, end_y, end_ox, end_oy
+        if upper == "M":
+            start_x, start_y, start_ox, start_oy = x, y, ox, oy
+    return "".join(out)
+
+
+def _optimize_piece(root, scale, min_x, min_y, precision):
+    """
+    Strips non-rendering nodes from a parsed piece SVG and rounds its
+    coordinates to *precision* decimals of the square size. The scaling to
+    the square size is baked into the coordinates if that does not change the
+    rendering, otherwise it is kept as a transform. Returns the attributes of
+    the group wrapping the content.
+    """
+    _strip_piece(root)
+
+    if _can_bake(root):
+        stroked = any(element.get("stroke") is not None or "stroke" in element.get("style", "") for element in root.iterdescendants())
+        # Default stroke width of 1 in source coordinates
+        attrs = {"stroke-width": _number(scale, precision)} if stroked and scale != 1 else {}
+        dx, dy = -min_x * scale, -min_y * scale
+    else:
+        transform = []
+        if scale != 1:
+            transform.append("scale(%s)" % scale)
+        if min_x or min_y:
+            transform.append("translate(%s, %s)" % (-min_x, -min_y))
+        attrs = {"transform": " ".join(transform)} if transform else {}
+        if precision is not None:
+            # Round in source coordinates to the same output precision
+            precision = max(0, precision + math.floor(math.log10(scale)))
+        scale, dx, dy = 1, 0, 0
+
+    for element in root.iterdescendants():
+        name = _local_name(element)
+        if name == "path" and element.get("d") is not None:
+            try:
+                element.set("d", _transform_path(element.get("d"), scale, dx, dy, precision))
+            except ValueError:
+                pass
+        elif name in ("polygon", "polyline") and element.get("points") is not None:
+            try:
+                values = _parse_points(element.get("points"))
+            except ValueError:
+                continue
+            element.set("points", " ".join(
+                _number(_round(value * scale + (dy if i % 2 else dx), precision), precision) for i, value in enumerate(values)))
+        for attr, kind in SHAPE_COORDINATES.get(name, {}).items():
+            value = element.get(attr, "0" if {"x": dx, "y": dy, "r": 0}[kind] else None)
+            if value is None or not _PLAIN_NUMBER.match(value):
+                continue
+            value = float(value) * scale + {"x": dx, "y": dy, "r": 0}[kind]
+            element.set(attr, _number(_round(value, precision), precision))
+        if scale != 1:
+            if element.get("stroke-width") is not None:
+                element.set("stroke-width", _number(_length(element.get("stroke-width")) * scale, precision))
+            if "stroke-width" in element.get("style", ""):
+                element.set("style", re.sub(r"(stroke-width\s*:\s*)([^;]+)", lambda m: m.group(1) + _number(_length(m.group(2)) * scale, precision), element.get("style")))
+    return attrs
+
+
+def _length(value):
+    """Parses an SVG length like ``45``, ``45px`` or ``45.0pt`` to a number, ignoring the unit."""
+    match = re.match(r"\s*([0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)", value or "")
+    if match is None or (value or "").strip().endswith("%"):
+        return None
+    return float(match.group(1))
+
+
+def _piece_element(css, symbol):
+    """
+    Returns the definition of a piece as an element, parsing the serialized
+    definition in :data:`SVG_PIECES` only once. Returns ``None`` for pieces
+    that have no usable definition.
+    """
+    try:
+        return SVG_PIECE_ELEMENTS[css, symbol]
+    except KeyError:
+        pass
+
+    svg = SVG_PIECES.get(css, {}).get(symbol)
+    if svg is None:
+        return None  # Not loaded (yet)
+    element = ET.fromstring(svg) if svg else None
+    SVG_PIECE_ELEMENTS[css, symbol] = element
+    return element
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_fragment(markup):
+    """Parses serialized markup, which may consist of several elements, once."""
+    return list(ET.fromstring("<g xmlns:xlink=\"http://www.w3.org/1999/xlink\">%s</g>" % markup))
+
+
+def piece_sets():
+    """Returns the names of all piece sets in :data:`STATIC_PATH`, e.g., ``standard/standard``."""
+    if _manifest_scanned:
+        piece_path = "piece" + os.sep
+        return sorted(path[len(piece_path):-len(".css")].replace(os.sep, "/")
+                      for path in MANIFEST if path.startswith(piece_path) and path.endswith(".css"))
+    piece_path = os.path.join(STATIC_PATH, "piece")
+    return sorted(os.path.relpath(css_path, piece_path)[:-len(".css")].replace(os.sep, "/")
+                  for css_path in glob.glob(os.path.join(piece_path, "**", "*.css"), recursive=True))
+
+
+def load_piece_set(css):
+    """Loads all pieces of a piece set that are not loaded yet, instead of on demand."""
+    if css not in SVG_PIECES:
+        get_svg_pieces_from_css(css)
+    for symbol in SVG_PATH_PIECES[css]:
+        if symbol in SVG_PIECES[css]:
+            continue
+        try:
+            piece = pychess.Piece.from_symbol(symbol)
+        except ValueError:
+            print("ERROR: Unsupported piece symbol %s in %s.css" % (symbol, css))
+            continue
+        try:
+            read_piece_svg(css, piece)
+        except Exception as e:
+            print("ERROR: Could not load %s from %s.css: %s" % (symbol, css, e))
+
+
+def _timed_load_piece_set(css):
+    start = time.perf_counter()
+    load_piece_set(css)
+    return css, SVG_PATH_PIECES[css], SVG_PIECES[css], PIECE_STATS.get(css, [0, 0]), time.perf_counter() - start
+
+
+def _stats(css):
+    original, optimized = PIECE_STATS.get(css, (0, 0))
+    if not original:
+        return ""
+    return ", %d -> %d bytes (%+.0f%%)" % (original, optimized, (optimized - original) * 100 / original)
+
+
+def preload(css_list=None, jobs=1):
+    """
+    Loads the given piece sets (default: all that are not loaded yet) ahead
+    of time, optionally in *jobs* parallel processes, and reports the load
+    time of each set.
+    """
+    if css_list is None:
+        css_list = [css for css in piece_sets() if css not in SVG_PIECES]
+
+    start = time.perf_counter()
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            results = list(executor.map(_timed_load_piece_set, css_list))
+    else:
+        results = [_timed_load_piece_set(css) for css in css_list]
+
+    for css, path_pieces, pieces, stats, seconds in results:
+        SVG_PATH_PIECES[css] = path_pieces
+        SVG_PIECES[css] = pieces
+        PIECE_STATS[css] = stats
+        for symbol, svg in pieces.items():
+            if not svg:
+                _set_missing((css, symbol))
+        print("Loaded %s: %d pieces in %.1f ms%s" % (css, len(pieces), seconds * 1000, _stats(css)))
+    print("Loaded %d piece sets in %.1f ms" % (len(results), (time.perf_counter() - start) * 1000))
+
+
+def _file_stamp(path):
+    """Returns the size, modification time and SHA-1 of a file, or ``None`` if it is missing."""
+    try:
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns, digest]
+
+
+def _file_changed(path, stamp):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        # Not deployed at all, so the bundle is the only source
+        return False
+    if stamp is None:
+        return True
+    if [stat.st_size, stat.st_mtime_ns] == stamp[:2]:
+        return False
+    return _file_stamp(path)[2] != stamp[2]
+
+
+def build_bundle(path, css_list=None):
+    """
+    Writes the given piece sets (default: all) with their pre-scaled piece
+    definitions into a single bundle file, that :func:`load_bundle()` loads
+    without parsing any CSS or SVG.
+    """
+    if css_list is None:
+        css_list = piece_sets()
+
+    sets = {}
+    for css in css_list:
+        load_piece_set(css)
+        files = {os.path.join("piece", css + ".css"): None}
+        for symbol in SVG_PATH_PIECES[css]:
+            files[_piece_path(css, symbol)] = None
+        for rel_path in files:
+            files[rel_path] = _file_stamp(os.path.join(STATIC_PATH, rel_path))
+        pieces = {}
+        for symbol, svg in SVG_PIECES[css].items():
+            svg = re.sub(r">\s+<", "><", svg)
+            pieces[symbol] = [svg, hashlib.sha1(svg.encode("utf-8")).hexdigest()]
+        sets[css] = {
+            "hash": hashlib.sha1(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest(),
+            "files": files,
+            "paths": SVG_PATH_PIECES[css],
+            "pieces": pieces,
+        }
+        print("Bundled %s: %d pieces%s" % (css, len(pieces), _stats(css)))
+
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump({"version": 1, "sets": sets}, f, separators=(",", ":"))
+
+
+def load_bundle(path):
+    """
+    Loads the piece sets from a bundle written by :func:`build_bundle()`.
+    Piece sets whose files have changed since the bundle was built are
+    skipped, so that they are loaded from the files on demand.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        bundle = json.load(f)
+
+    loaded, stale = 0, []
+    for css, entry in bundle["sets"].items():
+        if any(_file_changed(os.path.join(STATIC_PATH, rel_path), stamp) for rel_path, stamp in entry["files"].items()):
+            stale.append(css)
+            continue
+        SVG_PATH_PIECES[css] = entry["paths"]
+        SVG_PIECES[css] = {symbol: svg for symbol, (svg, _) in entry["pieces"].items()}
+        PIECE_STATS[css] = [0, 0]  # The original sizes are not bundled
+        ASSET_VERSIONS[os.path.join("piece", css + ".css")] = entry["hash"][:16]
+        loaded += 1
+
+    print("Loaded %d piece sets from %s" % (loaded, path))
+    if stale:
+        print("WARNING: %d stale piece sets in %s, loading them from files: %s" % (len(stale), path, ", ".join(stale)))
+
+
+class SvgWrapper(str):
+    def _repr_svg_(self):
+        return self
+
+
+def _svg(viewbox_x, viewbox_y, width, height):
+    svg = ET.Element("svg", {
+        "xmlns": "http://www.w3.org/2000/svg",
+        "version": "1.1",
+        "xmlns:xlink": "http://www.w3.org/1999/xlink",
+        "viewBox": "0 0 %d %d" % (viewbox_x, viewbox_y),
+    })
+
+    if width is not None:
+        svg.set("width", str(width))
+    if height is not None:
+        svg.set("height", str(height))
+
+    return svg
+
+
+def _attrs(attrs: Dict[str, Union[str, int, float, None]]) -> Dict[str, str]:
+    return {k: str(v) for k, v in attrs.items() if v is not None}
+
+
+def _select_color(colors: Dict[str, str], color: str) -> Tuple[str, float]:
+    return _color(colors.get(color, DEFAULT_COLORS[color]))
+
+
+def _color(color: str) -> Tuple[str, float]:
+    if color.startswith("#"):
+        try:
+            if len(color) == 5:
+                return color[:4], int(color[4], 16) / 0xf
+            elif len(color) == 9:
+                return color[:7], int(color[7:], 16) / 0xff
+        except ValueError:
+            pass  # Ignore invalid hex value
+    return color, 1.0
+
+
+def piece(css, piece, size=None):
+    """
+    Renders the given :class:`pychess.Piece` as an SVG image.
+    """
+    svg = _svg(SQUARE_SIZE, SQUARE_SIZE, size, size)
+    element = _piece_element(css, piece.symbol)
+    if element is not None:
+        svg.append(element)
+    return SvgWrapper(ET.tostring(svg).decode("utf-8"))
+
+
+def _colors_to_css(colors: Dict[str, str]) -> str:
+    """Convert a color mapping dictionary into a CSS string."""
+    lines = []
+    for selector, value in colors.items():
+        classes = "." + ".".join(selector.split())
+        lines.append(f"{classes} {{ fill: {value}; }}")
+    return "\n".join(lines)
+
+
+# SVG path definitions for coordinate glyphs (a-l, 1-12, etc.)
+COORD_SVG_PATHS = {
+    'a': "<path d='M5.654296875 4.697265625Q3.4765625 4.697265625 2.63671875 5.1953125Q1.796875 5.693359375 1.796875 6.89453125Q1.796875 7.8515625 2.4267578125 8.4130859375Q3.056640625 8.974609375 4.140625 8.974609375Q5.634765625 8.974609375 6.5380859375 7.9150390625Q7.44140625 6.85546875 7.44140625 5.09765625V4.697265625ZM9.23828125 3.955078125V10.1953125H7.44140625V8.53515625Q6.826171875 9.53125 5.908203125 10.0048828125Q4.990234375 10.478515625 3.662109375 10.478515625Q1.982421875 10.478515625 0.9912109375 9.5361328125Q0.0 8.59375 0.0 7.01171875Q0.0 5.166015625 1.2353515625 4.228515625Q2.470703125 3.291015625 4.921875 3.291015625H7.44140625V3.115234375Q7.44140625 1.875 6.6259765625 1.1962890625Q5.810546875 0.517578125 4.3359375 0.517578125Q3.3984375 0.517578125 2.509765625 0.7421875Q1.62109375 0.966796875 0.80078125 1.416015625V-0.244140625Q1.787109375 -0.625 2.71484375 -0.8154296875Q3.642578125 -1.005859375 4.521484375 -1.005859375Q6.89453125 -1.005859375 8.06640625 0.224609375Q9.23828125 1.455078125 9.23828125 3.955078125Z'/>",
+    'b': "<path d='M7.919921875 4.736328125Q7.919921875 2.75390625 7.1044921875 1.6259765625Q6.2890625 0.498046875 4.86328125 0.498046875Q3.4375 0.498046875 2.6220703125 1.6259765625Q1.806640625 2.75390625 1.806640625 4.736328125Q1.806640625 6.71875 2.6220703125 7.8466796875Q3.4375 8.974609375 4.86328125 8.974609375Q6.2890625 8.974609375 7.1044921875 7.8466796875Q7.919921875 6.71875 7.919921875 4.736328125ZM1.806640625 0.91796875Q2.373046875 -0.05859375 3.2373046875 -0.5322265625Q4.1015625 -1.005859375 5.302734375 -1.005859375Q7.294921875 -1.005859375 8.5400390625 0.576171875Q9.78515625 2.158203125 9.78515625 4.736328125Q9.78515625 7.314453125 8.5400390625 8.896484375Q7.294921875 10.478515625 5.302734375 10.478515625Q4.1015625 10.478515625 3.2373046875 10.0048828125Q2.373046875 9.53125 1.806640625 8.5546875V10.1953125H0.0V-5.0H1.806640625Z'/>",
+    'c': "<path d='M8.65234375 -0.322265625V1.357421875Q7.890625 0.9375 7.1240234375 0.7275390625Q6.357421875 0.517578125 5.576171875 0.517578125Q3.828125 0.517578125 2.861328125 1.6259765625Q1.89453125 2.734375 1.89453125 4.736328125Q1.89453125 6.73828125 2.861328125 7.8466796875Q3.828125 8.955078125 5.576171875 8.955078125Q6.357421875 8.955078125 7.1240234375 8.7451171875Q7.890625 8.53515625 8.65234375 8.115234375V9.775390625Q7.900390625 10.126953125 7.0947265625 10.302734375Q6.2890625 10.478515625 5.380859375 10.478515625Q2.91015625 10.478515625 1.455078125 8.92578125Q0.0 7.373046875 0.0 4.736328125Q0.0 2.060546875 1.4697265625 0.52734375Q2.939453125 -1.005859375 5.498046875 -1.005859375Q6.328125 -1.005859375 7.119140625 -0.8349609375Q7.91015625 -0.6640625 8.65234375 -0.322265625Z'/>",
+    'd': "<path d='M7.978515625 0.91796875V-5.0H9.775390625V10.1953125H7.978515625V8.5546875Q7.412109375 9.53125 6.5478515625 10.0048828125Q5.68359375 10.478515625 4.47265625 10.478515625Q2.490234375 10.478515625 1.2451171875 8.896484375Q0.0 7.314453125 0.0 4.736328125Q0.0 2.158203125 1.2451171875 0.576171875Q2.490234375 -1.005859375 4.47265625 -1.005859375Q5.68359375 -1.005859375 6.5478515625 -0.5322265625Q7.412109375 -0.05859375 7.978515625 0.91796875ZM1.85546875 4.736328125Q1.85546875 6.71875 2.6708984375 7.8466796875Q3.486328125 8.974609375 4.912109375 8.974609375Q6.337890625 8.974609375 7.158203125 7.8466796875Q7.978515625 6.71875 7.978515625 4.736328125Q7.978515625 2.75390625 7.158203125 1.6259765625Q6.337890625 0.498046875 4.912109375 0.498046875Q3.486328125 0.498046875 2.6708984375 1.6259765625Q1.85546875 2.75390625 1.85546875 4.736328125Z'/>",
+    'e': "<path d='M10.13671875 4.27734375V5.15625H1.875Q1.9921875 7.01171875 2.9931640625 7.9833984375Q3.994140625 8.955078125 5.78125 8.955078125Q6.81640625 8.955078125 7.7880859375 8.701171875Q8.759765625 8.447265625 9.716796875 7.939453125V9.638671875Q8.75 10.048828125 7.734375 10.263671875Q6.71875 10.478515625 5.673828125 10.478515625Q3.056640625 10.478515625 1.5283203125 8.955078125Q0.0 7.431640625 0.0 4.833984375Q0.0 2.1484375 1.4501953125 0.5712890625Q2.900390625 -1.005859375 5.361328125 -1.005859375Q7.568359375 -1.005859375 8.8525390625 0.4150390625Q10.13671875 1.8359375 10.13671875 4.27734375ZM8.33984375 3.75Q8.3203125 2.275390625 7.5146484375 1.396484375Q6.708984375 0.517578125 5.380859375 0.517578125Q3.876953125 0.517578125 2.9736328125 1.3671875Q2.0703125 2.216796875 1.93359375 3.759765625Z'/>",
+    'f': "<path d='M6.962890625 -5.0V-3.505859375H5.244140625Q4.27734375 -3.505859375 3.9013671875 -3.115234375Q3.525390625 -2.724609375 3.525390625 -1.708984375V-0.7421875H6.484375V0.654296875H3.525390625V10.1953125H1.71875V0.654296875H0.0V-0.7421875H1.71875V-1.50390625Q1.71875 -3.330078125 2.568359375 -4.1650390625Q3.41796875 -5.0 5.263671875 -5.0Z'/>",
+    'g': "<path d='M7.978515625 4.599609375Q7.978515625 2.646484375 7.1728515625 1.572265625Q6.3671875 0.498046875 4.912109375 0.498046875Q3.466796875 0.498046875 2.6611328125 1.572265625Q1.85546875 2.646484375 1.85546875 4.599609375Q1.85546875 6.54296875 2.6611328125 7.6171875Q3.466796875 8.69140625 4.912109375 8.69140625Q6.3671875 8.69140625 7.1728515625 7.6171875Q7.978515625 6.54296875 7.978515625 4.599609375ZM9.775390625 8.837890625Q9.775390625 11.630859375 8.53515625 12.9931640625Q7.294921875 14.35546875 4.736328125 14.35546875Q3.7890625 14.35546875 2.94921875 14.2138671875Q2.109375 14.072265625 1.318359375 13.779296875V12.03125Q2.109375 12.4609375 2.880859375 12.666015625Q3.65234375 12.87109375 4.453125 12.87109375Q6.220703125 12.87109375 7.099609375 11.9482421875Q7.978515625 11.025390625 7.978515625 9.16015625V8.271484375Q7.421875 9.23828125 6.552734375 9.716796875Q5.68359375 10.1953125 4.47265625 10.1953125Q2.4609375 10.1953125 1.23046875 8.662109375Q0.0 7.12890625 0.0 4.599609375Q0.0 2.060546875 1.23046875 0.52734375Q2.4609375 -1.005859375 4.47265625 -1.005859375Q5.68359375 -1.005859375 6.552734375 -0.52734375Q7.421875 -0.048828125 7.978515625 0.91796875V-0.7421875H9.775390625Z'/>",
+    'h': "<path d='M9.16015625 3.59375V10.1953125H7.36328125V3.65234375Q7.36328125 2.099609375 6.7578125 1.328125Q6.15234375 0.556640625 4.94140625 0.556640625Q3.486328125 0.556640625 2.646484375 1.484375Q1.806640625 2.412109375 1.806640625 4.013671875V10.1953125H0.0V-5.0H1.806640625V0.95703125Q2.451171875 -0.029296875 3.3251953125 -0.517578125Q4.19921875 -1.005859375 5.341796875 -1.005859375Q7.2265625 -1.005859375 8.193359375 0.1611328125Q9.16015625 1.328125 9.16015625 3.59375Z'/>",
+    'i': "<path d='M0.0 -0.7421875H1.796875V10.1953125H0.0ZM0.0 -5.0H1.796875V-2.724609375H0.0Z'/>",
+    'j': "<path d='M2.24609375 -0.7421875H4.04296875V10.390625Q4.04296875 12.48046875 3.2470703125 13.41796875Q2.451171875 14.35546875 0.68359375 14.35546875H0.0V12.83203125H0.478515625Q1.50390625 12.83203125 1.875 12.3583984375Q2.24609375 11.884765625 2.24609375 10.390625ZM2.24609375 -5.0H4.04296875V-2.724609375H2.24609375Z'/>",
+    '1': "<path d='M0.283203125 8.53515625H3.505859375V-2.587890625L0.0 -1.884765625V-3.681640625L3.486328125 -4.384765625H5.458984375V8.53515625H8.681640625V10.1953125H0.283203125Z'/>",
+    '2': "<path d='M2.373046875 8.53515625H9.2578125V10.1953125H0.0V8.53515625Q1.123046875 7.373046875 3.0615234375 5.4150390625Q5.0 3.45703125 5.498046875 2.890625Q6.4453125 1.826171875 6.8212890625 1.0888671875Q7.197265625 0.3515625 7.197265625 -0.361328125Q7.197265625 -1.5234375 6.3818359375 -2.255859375Q5.56640625 -2.98828125 4.2578125 -2.98828125Q3.330078125 -2.98828125 2.2998046875 -2.666015625Q1.26953125 -2.34375 0.09765625 -1.689453125V-3.681640625Q1.2890625 -4.16015625 2.32421875 -4.404296875Q3.359375 -4.6484375 4.21875 -4.6484375Q6.484375 -4.6484375 7.83203125 -3.515625Q9.1796875 -2.3828125 9.1796875 -0.869140625Q9.1796875 0.341796875 8.564453125 1.1767578125Q7.87109375 2.01171875 6.591796875 2.333984375Z'/>",
+    '3': "<path d='M6.591796875 2.333984375Q8.0078125 2.63671875 8.8037109375 3.59375Q9.599609375 4.55078125 9.599609375 5.95703125Q9.599609375 8.115234375 8.115234375 9.296875Q6.630859375 10.478515625 3.896484375 10.478515625Q2.978515625 10.478515625 2.0068359375 10.2978515625Q1.03515625 10.1171875 0.0 9.755859375V7.8515625Q0.8203125 8.330078125 1.796875 8.57421875Q2.7734375 8.818359375 3.837890625 8.818359375Q5.693359375 8.818359375 6.6650390625 8.0859375Q7.63671875 7.353515625 7.63671875 5.95703125Q7.63671875 4.66796875 6.7333984375 3.9404296875Q5.830078125 3.212890625 4.21875 3.212890625H2.51953125V1.591796875H4.296875Q5.751953125 1.591796875 6.5234375 1.0107421875Q7.294921875 0.4296875 7.294921875 -0.6640625Q7.294921875 -1.787109375 6.4990234375 -2.3876953125Q5.703125 -2.98828125 4.21875 -2.98828125Q3.408203125 -2.98828125 2.48046875 -2.8125Q1.552734375 -2.63671875 0.439453125 -2.265625V-4.0234375Q1.5625 -4.3359375 2.5439453125 -4.4921875Q3.525390625 -4.6484375 4.39453125 -4.6484375Q6.640625 -4.6484375 7.94921875 -3.6279296875Q9.2578125 -2.607421875 9.2578125 -0.869140625Q9.2578125 0.341796875 8.564453125 1.1767578125Q7.87109375 2.01171875 6.591796875 2.333984375Z'/>",
+    '4': "<path d='M6.58203125 -2.666015625 1.6015625 5.1171875H6.58203125ZM6.064453125 -4.384765625H8.544921875V5.1171875H10.625V6.7578125H8.544921875V10.1953125H6.58203125V6.7578125H0.0V4.853515625Z'/>",
+    '5': "<path d='M0.615234375 -4.384765625H8.359375V-2.724609375H2.421875V0.849609375Q2.8515625 0.703125 3.28125 0.6298828125Q3.7109375 0.556640625 4.140625 0.556640625Q6.58203125 0.556640625 8.0078125 1.89453125Q9.43359375 3.232421875 9.43359375 5.517578125Q9.43359375 7.87109375 7.96875 9.1748046875Q6.50390625 10.478515625 3.837890625 10.478515625Q2.919921875 10.478515625 1.9677734375 10.322265625Q1.015625 10.166015625 0.0 9.853515625V7.87109375Q0.87890625 8.349609375 1.81640625 8.583984375Q2.75390625 8.818359375 3.798828125 8.818359375Q5.48828125 8.818359375 6.474609375 7.9296875Q7.4609375 7.041015625 7.4609375 5.517578125Q7.4609375 3.994140625 6.474609375 3.10546875Q5.48828125 2.216796875 3.798828125 2.216796875Q3.0078125 2.216796875 2.2216796875 2.392578125Q1.435546875 2.568359375 0.615234375 2.939453125Z'/>",
+    '6': "<path d='M5.205078125 2.119140625Q3.876953125 2.119140625 3.1005859375 3.02734375Q2.32421875 3.935546875 2.32421875 5.517578125Q2.32421875 7.08984375 3.1005859375 8.0029296875Q3.876953125 8.916015625 5.205078125 8.916015625Q6.533203125 8.916015625 7.3095703125 8.0029296875Q8.0859375 7.08984375 8.0859375 5.517578125Q8.0859375 3.935546875 7.3095703125 3.02734375Q6.533203125 2.119140625 5.205078125 2.119140625ZM9.12109375 -4.0625V-2.265625Q8.37890625 -2.6171875 7.6220703125 -2.802734375Q6.865234375 -2.98828125 6.123046875 -2.98828125Q4.169921875 -2.98828125 3.1396484375 -1.669921875Q2.109375 -0.3515625 1.962890625 2.314453125Q2.5390625 1.46484375 3.408203125 1.0107421875Q4.27734375 0.556640625 5.322265625 0.556640625Q7.51953125 0.556640625 8.7939453125 1.8896484375Q10.068359375 3.22265625 10.068359375 5.517578125Q10.068359375 7.763671875 8.740234375 9.12109375Q7.412109375 10.478515625 5.205078125 10.478515625Q2.67578125 10.478515625 1.337890625 8.5400390625Q0.0 6.6015625 0.0 2.919921875Q0.0 -0.537109375 1.640625 -2.5927734375Q3.28125 -4.6484375 6.044921875 -4.6484375Q6.787109375 -4.6484375 7.5439453125 -4.501953125Q8.30078125 -4.35546875 9.12109375 -4.0625Z'/>",
+    '7': "<path d='M0.0 -4.384765625H9.375V-3.544921875L4.08203125 10.1953125H2.021484375L7.001953125 -2.724609375H0.0Z'/>",
+    '8': "<path d='M5.0 3.271484375Q3.59375 3.271484375 2.7880859375 4.0234375Q1.982421875 4.775390625 1.982421875 6.09375Q1.982421875 7.412109375 2.7880859375 8.1640625Q3.59375 8.916015625 5.0 8.916015625Q6.40625 8.916015625 7.216796875 8.1591796875Q8.02734375 7.40234375 8.02734375 6.09375Q8.02734375 4.775390625 7.2216796875 4.0234375Q6.416015625 3.271484375 5.0 3.271484375ZM3.02734375 2.431640625Q1.7578125 2.119140625 1.0498046875 1.25Q0.341796875 0.380859375 0.341796875 -0.869140625Q0.341796875 -2.6171875 1.5869140625 -3.6328125Q2.83203125 -4.6484375 5.0 -4.6484375Q7.177734375 -4.6484375 8.41796875 -3.6328125Q9.658203125 -2.6171875 9.658203125 -0.869140625Q9.658203125 0.380859375 8.9501953125 1.25Q8.2421875 2.119140625 6.982421875 2.431640625Q8.408203125 2.763671875 9.2041015625 3.73046875Q10.0 4.697265625 10.0 6.09375Q10.0 8.212890625 8.7060546875 9.345703125Q7.412109375 10.478515625 5.0 10.478515625Q2.587890625 10.478515625 1.2939453125 9.345703125Q0.0 8.212890625 0.0 6.09375Q0.0 4.697265625 0.80078125 3.73046875Q1.6015625 2.763671875 3.02734375 2.431640625ZM2.3046875 -0.68359375Q2.3046875 0.44921875 3.0126953125 1.083984375Q3.720703125 1.71875 5.0 1.71875Q6.26953125 1.71875 6.9873046875 1.083984375Q7.705078125 0.44921875 7.705078125 -0.68359375Q7.705078125 -1.81640625 6.9873046875 -2.451171875Q6.26953125 -3.0859375 5.0 -3.0859375Q3.720703125 -3.0859375 3.0126953125 -2.451171875Q2.3046875 -1.81640625 2.3046875 -0.68359375Z'/>",
+    '9': "<path d='M0.9375 9.892578125V8.095703125Q1.6796875 8.447265625 2.44140625 8.6328125Q3.203125 8.818359375 3.935546875 8.818359375Q5.888671875 8.818359375 6.9189453125 7.5048828125Q7.94921875 6.19140625 8.095703125 3.515625Q7.529296875 4.35546875 6.66015625 4.8046875Q5.791015625 5.25390625 4.736328125 5.25390625Q2.548828125 5.25390625 1.2744140625 3.9306640625Q0.0 2.607421875 0.0 0.3125Q0.0 -1.93359375 1.328125 -3.291015625Q2.65625 -4.6484375 4.86328125 -4.6484375Q7.392578125 -4.6484375 8.7255859375 -2.7099609375Q10.05859375 -0.771484375 10.05859375 2.919921875Q10.05859375 6.3671875 8.4228515625 8.4228515625Q6.787109375 10.478515625 4.0234375 10.478515625Q3.28125 10.478515625 2.51953125 10.33203125Q1.7578125 10.185546875 0.9375 9.892578125ZM4.86328125 3.7109375Q6.19140625 3.7109375 6.9677734375 2.802734375Q7.744140625 1.89453125 7.744140625 0.3125Q7.744140625 -1.259765625 6.9677734375 -2.1728515625Q6.19140625 -3.0859375 4.86328125 -3.0859375Q3.53515625 -3.0859375 2.7587890625 -2.1728515625Q1.982421875 -1.259765625 1.982421875 0.3125Q1.982421875 1.89453125 2.7587890625 2.802734375Q3.53515625 3.7109375 4.86328125 3.7109375Z'/>",
+    '0': "<path d='M5.0390625 -3.0859375Q3.515625 -3.0859375 2.7490234375 -1.5869140625Q1.982421875 -0.087890625 1.982421875 2.919921875Q1.982421875 5.91796875 2.7490234375 7.4169921875Q3.515625 8.916015625 5.0390625 8.916015625Q6.572265625 8.916015625 7.3388671875 7.4169921875Q8.10546875 5.91796875 8.10546875 2.919921875Q8.10546875 -0.087890625 7.3388671875 -1.5869140625Q6.572265625 -3.0859375 5.0390625 -3.0859375ZM5.0390625 -4.6484375Q7.490234375 -4.6484375 8.7841796875 -2.7099609375Q10.078125 -0.771484375 10.078125 2.919921875Q10.078125 6.6015625 8.7841796875 8.5400390625Q7.490234375 10.478515625 5.0390625 10.478515625Q2.587890625 10.478515625 1.2939453125 8.5400390625Q0.0 6.6015625 0.0 2.919921875Q0.0 -0.771484375 1.2939453125 -2.7099609375Q2.587890625 -4.6484375 5.0390625 -4.6484375Z'/>",
+    '10': "<path d='M-0.6787109375 8.53515625H2.5439453125V-2.587890625L-0.9619140625 -1.884765625V-3.681640625L2.5244140625 -4.384765625H4.4970703125V8.53515625H7.7197265625V10.1953125H-0.6787109375ZM15.9228515625 -3.0859375Q14.3994140625 -3.0859375 13.6328125 -1.5869140625Q12.8662109375 -0.087890625 12.8662109375 2.919921875Q12.8662109375 5.91796875 13.6328125 7.4169921875Q14.3994140625 8.916015625 15.9228515625 8.916015625Q17.4560546875 8.916015625 18.22265625 7.4169921875Q18.9892578125 5.91796875 18.9892578125 2.919921875Q18.9892578125 -0.087890625 18.22265625 -1.5869140625Q17.4560546875 -3.0859375 15.9228515625 -3.0859375ZM15.9228515625 -4.6484375Q18.3740234375 -4.6484375 19.66796875 -2.7099609375Q20.9619140625 -0.771484375 20.9619140625 2.919921875Q20.9619140625 6.6015625 19.66796875 8.5400390625Q18.3740234375 10.478515625 15.9228515625 10.478515625Q13.4716796875 10.478515625 12.177734375 8.5400390625Q10.8837890625 6.6015625 10.8837890625 2.919921875Q10.8837890625 -0.771484375 12.177734375 -2.7099609375Q13.4716796875 -4.6484375 15.9228515625 -4.6484375Z'/>",
+
+}
+
+def get_coord_svg(label, x, y, size, color, opacity=1.0):
+    """Return an SVG <g> element for a coordinate label using a path from COORD_SVG_PATHS."""
+    if label not in COORD_SVG_PATHS:
+        return None
+    group = ET.Element("g", {
+        "transform": f"translate({x},{y}) scale({size/32.0})",
+        "fill": color,
+        "stroke": color,
+        "opacity": str(opacity),
+    })
+    group.extend(_parse_fragment(COORD_SVG_PATHS[label]))
+    return group
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_attrib(value: str) -> str:
+    return _escape(value).replace("\"", "&quot;").replace("\n", "&#10;")
+
+
+def _serialize_attrs(attrs: Dict[str, str]) -> str:
+    return "".join(" %s=\"%s\"" % (name, _escape_attrib(value)) for name, value in attrs.items())
+
+
+class _TreeBuilder:
+    """Assembles an SVG document as an :mod:`xml.etree.ElementTree` tree."""
+
+    def __init__(self, attrs):
+        self.root = ET.Element("svg", attrs)
+        self.stack = [self.root]
+
+    def open(self, tag, attrs=None):
+        self.stack.append(ET.SubElement(self.stack[-1], tag, attrs or {}))
+
+    def close(self):
+        self.stack.pop()
+
+    def element(self, tag, attrs, text=None):
+        ET.SubElement(self.stack[-1], tag, attrs).text = text
+
+    def fragment(self, markup=None, element=None):
+        if element is not None:
+            self.stack[-1].append(element)
+        else:
+            self.stack[-1].extend(_parse_fragment(markup))
+
+    def tostring(self):
+        return ET.tostring(self.root).decode("utf-8")
+
+
+class _TemplateBuilder:
+    """
+    Assembles an SVG document by appending serialized fragments to a single
+    buffer, without building a tree.
+    """
+
+    def __init__(self, attrs=None):
+        self.parts = []
+        self.stack = []
+        if attrs is not None:
+            self.open("svg", attrs)
+
+    def open(self, tag, attrs=None):
+        self.parts.append("<%s%s>" % (tag, _serialize_attrs(attrs or {})))
+        self.stack.append(tag)
+
+    def close(self):
+        self.parts.append("</%s>" % self.stack.pop())
+
+    def element(self, tag, attrs, text=None):
+        if text is None:
+            self.parts.append("<%s%s />" % (tag, _serialize_attrs(attrs)))
+        else:
+            self.parts.append("<%s%s>%s</%s>" % (tag, _serialize_attrs(attrs), _escape(text), tag))
+
+    def fragment(self, markup=None, element=None):
+        self.parts.append(markup if markup is not None else ET.tostring(element, encoding="unicode"))
+
+    def tostring(self):
+        while self.stack:
+            self.close()
+        return "".join(self.parts)
+
+
+ENGINES = {
+    "etree": _TreeBuilder,
+    "template": _TemplateBuilder,
+}
+
+
+def _background_path(background_image):
+    """Returns the path of a board background, or ``None`` if it is missing."""
+    path = os.path.join("images", "board", background_image)
+    if path in MISSING:
+        return None
+    full_path = static_file(path)
+    if full_path is None:
+        _set_missing(path, "FileNotFoundError %s" % os.path.join(STATIC_PATH, path))
+    return full_path
+
+
+@functools.lru_cache(maxsize=64)
+def _background_svg(background_image, version, rows, cols, margin):
+    """
+    Returns the given SVG board background scaled to the board as markup.
+    *version* is the :func:`asset_version()` of the file, so that modified
+    files are not served from the cache.
+    """
+    bg_path = static_file(os.path.join("images", "board", background_image))
+    with open(bg_path, 'r', encoding='utf-8') as f:
+        bg_svg = f.read()
+    # Remove XML declaration if present
+    if bg_svg.startswith('<?xml'):
+        bg_svg = bg_svg.split('?>', 1)[-1]
+    # Parse the SVG and extract width/height or viewBox
+    bg_tree = ET.fromstring(bg_svg)
+    if not bg_tree.tag.endswith('svg'):
+        # fallback: insert as a group
+        return f'<g>{bg_svg}</g>'
+
+    bg_width = bg_tree.get('width')
+    bg_height = bg_tree.get('height')
+    viewBox = bg_tree.get('viewBox')
+    if bg_width and bg_height:
+        try:
+            width_val = float(bg_width.replace('px', ''))
+            height_val = float(bg_height.replace('px', ''))
+        except Exception:
+            width_val = cols * SQUARE_SIZE
+            height_val = rows * SQUARE_SIZE
+    elif viewBox:
+        parts = viewBox.strip().split()
+        width_val = float(parts[2])
+        height_val = float(parts[3])
+    else:
+        width_val = cols * SQUARE_SIZE
+        height_val = rows * SQUARE_SIZE
+    # Remove <svg> wrapper, keep children
+    bg_group = ET.Element('g')
+    for elem in list(bg_tree):
+        bg_group.append(elem)
+    # The board document declares the SVG namespace as default namespace
+    for elem in bg_group.iter():
+        if elem.tag.startswith("{%s}" % SVG_NS):
+            elem.tag = elem.tag[len(SVG_NS) + 2:]
+    scale_x = (cols * SQUARE_SIZE) / width_val
+    scale_y = (rows * SQUARE_SIZE) / height_val
+    bg_group.set('transform', f'translate({margin}, {margin}) scale({scale_x}, {scale_y})')
+    return ET.tostring(bg_group, encoding="unicode")
+
+
+@functools.lru_cache(maxsize=64)
+def _background_data_uri(background_image, version, width, height):
+    """
+    Returns the given PNG/JPG board background as a base64 data URI,
+    downscaled to *width* x *height* pixels if it is larger. *version* is the
+    :func:`asset_version()` of the file, so that modified files are not
+    served from the cache.
+    """
+    img_path = static_file(os.path.join("images", "board", background_image))
+    with open(img_path, 'rb') as img_file:
+        img_bytes = img_file.read()
+    ext = os.path.splitext(background_image)[1].lower()
+    if ext == '.jpg' or ext == '.jpeg':
+        mime = 'image/jpeg'
+    elif ext == '.png':
+        mime = 'image/png'
+    else:
+        mime = 'application/octet-stream'
+    if mime != 'application/octet-stream':
+        img_bytes = _downscale(img_bytes, width, height)
+    return f"data:{mime};base64," + base64.b64encode(img_bytes).decode('ascii')
+
+
+def _downscale(img_bytes, width, height):
+    """Downscales a PNG or JPEG image to at most *width* x *height* pixels, if that makes it smaller."""
+    from PIL import Image  # Only needed for raster backgrounds
+
+    with Image.open(io.BytesIO(img_bytes)) as image:
+        if image.width <= width and image.height <= height:
+            return img_bytes
+        fmt = image.format
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA" if fmt == "PNG" else "RGB")
+        resized = image.resize((min(width, image.width), min(height, image.height)), Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    if fmt == "JPEG":
+        resized.save(out, "JPEG", quality=90)
+    else:
+        resized.save(out, "PNG", optimize=True)
+    return out.getvalue() if out.tell() < len(img_bytes) else img_bytes
+
+
+class _BoardGeometry:
+    """
+    Positions of the squares of a board with a given shape and orientation
+    in the document, see :func:`_geometry()`.
+    """
+
+    def __init__(self, rows, cols, orientation, margin):
+        self.rows = rows
+        self.cols = cols
+        self.orientation = orientation
+        self.margin = margin
+
+        # Top left corners, indexed by board row and column, and the squares
+        # in document order as (row, col, x, y).
+        self.origins = [[None] * cols for _ in range(rows)]
+        self.layout = []
+        for y_index in range(rows):
+            for x_index in range(cols):
+                if orientation:
+                    row, col = y_index, x_index
+                else:
+                    row, col = rows - y_index - 1, cols - x_index - 1
+                x = x_index * SQUARE_SIZE + margin
+                y = y_index * SQUARE_SIZE + margin
+                self.origins[row][col] = (x, y)
+                self.layout.append((row, col, x, y))
+
+        # Board row and column of each square name, e.g., a1, and the centers
+        # of the squares, where arrows start and end.
+        self.squares = {"%s%d" % (chr(ord("a") + col), rows - row): (row, col) for row in range(rows) for col in range(cols)}
+        self.anchors = {name: (self.origins[row][col][0] + SQUARE_SIZE / 2, self.origins[row][col][1] + SQUARE_SIZE / 2)
+                        for name, (row, col) in self.squares.items()}
+
+        # File and rank labels in document order for each coordinate system
+        self.labels = {
+            system: ([files(x_index if orientation else cols - x_index - 1, cols) for x_index in range(cols)],
+                     [ranks(y_index if orientation else rows - y_index - 1, rows) for y_index in range(rows)])
+            for system, (files, ranks) in pychess.COORDS.items()
+        }
+
+    def square(self, name):
+        """Returns the board row and column of a square name, which may be off the board."""
+        try:
+            return self.squares[name]
+        except KeyError:
+            return self.rows - square_rank(name) - 1, square_file(name)
+
+    def anchor(self, name):
+        """Returns the center of a square, which may be off the board."""
+        try:
+            return self.anchors[name]
+        except KeyError:
+            row, col = self.square(name)
+            if not self.orientation:
+                row, col = self.rows - row - 1, self.cols - col - 1
+            return col * SQUARE_SIZE + self.margin + SQUARE_SIZE / 2, row * SQUARE_SIZE + self.margin + SQUARE_SIZE / 2
+
+
+@functools.lru_cache(maxsize=256)
+def _geometry(rows, cols, orientation, margin):
+    """Returns the shared :class:`_BoardGeometry` of boards with the given shape and orientation."""
+    return _BoardGeometry(rows, cols, orientation, margin)
+
+
+@functools.lru_cache(maxsize=256)
+def _board_layer(rows, cols, orientation, coordinates, render_squares, compact=False, prefix=""):
+    """
+    Returns the serialized static layer of a board, i.e., the squares and the
+    coordinates. Both depend only on the geometry of the board, so they are
+    built once per geometry and reused. Themes are applied by the <style>
+    element of the document. *prefix* is prepended to the ids the layer
+    defines, so that several layers can be used in one document.
+    """
+    svg = _TemplateBuilder()
+    margin = 15 if coordinates else 0
+
+    # Render board squares only if not using a background image
+    if render_squares and compact:
+        # A single rect filled with a 2x2 squares pattern. The top left square
+        # is dark only if the board is flipped and has an odd number of squares
+        # per rank and file combined.
+        top_left, other = ("light", "dark") if orientation or (rows + cols) % 2 == 0 else ("dark", "light")
+        svg.open("defs")
+        svg.open("pattern", _attrs({
+            "id": prefix + "checkerboard",
+            "x": margin,
+            "y": margin,
+            "width": 2 * SQUARE_SIZE,
+            "height": 2 * SQUARE_SIZE,
+            "patternUnits": "userSpaceOnUse",
+        }))
+        for x, y, width, height, color in [(0, 0, 2 * SQUARE_SIZE, 2 * SQUARE_SIZE, top_left),
+                                           (SQUARE_SIZE, 0, SQUARE_SIZE, SQUARE_SIZE, other),
+                                           (0, SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE, other)]:
+            svg.element("rect", _attrs({
+                "x": x,
+                "y": y,
+                "width": width,
+                "height": height,
+                "class": "square " + color,
+                "stroke": "none",
+                "fill": DEFAULT_COLORS["square " + color],
+            }))
+        svg.close()
+        svg.close()
+        svg.element("rect", _attrs({
+            "x": margin,
+            "y": margin,
+            "width": cols * SQUARE_SIZE,
+            "height": rows * SQUARE_SIZE,
+            "fill": "url(#%scheckerboard)" % prefix,
+        }))
+    elif render_squares:
+        for y_index in range(rows):
+            for x_index in range(cols):
+                if orientation:
+                    display_row = y_index
+                    display_col = x_index
+                else:
+                    display_row = rows - y_index - 1
+                    display_col = cols - x_index - 1
+                cls = "square light" if display_col % 2 == display_row % 2 else "square dark"
+                svg.element("rect", {
+                    "x": str(x_index * SQUARE_SIZE + margin),
+                    "y": str(y_index * SQUARE_SIZE + margin),
+                    "width": str(SQUARE_SIZE),
+                    "height": str(SQUARE_SIZE),
+                    "class": cls,
+                    "stroke": "none",
+                    "fill": DEFAULT_COLORS[cls],
+                })
+
+    # Render coordinates using SVG path glyphs for robustness
+    if coordinates:
+        coord_size = int(margin * 0.9)
+        text_color = DEFAULT_COLORS["coord"]
+        offset = 5
+        labels = []
+        file_labels, rank_labels = _geometry(rows, cols, orientation, margin).labels[coordinates]
+        # Center coordinates in the margin area for files (bottom/top)
+        for file_index, file_char in enumerate(file_labels):
+            x = file_index * SQUARE_SIZE + margin + SQUARE_SIZE // 2 - coord_size // 2 + offset
+            y_top = margin // 2 - coord_size // 2 + offset
+            y_bottom = margin + rows * SQUARE_SIZE + margin // 2 - coord_size // 2 + offset
+            for y in (y_top, y_bottom):
+                labels.append((file_char, x, y))
+        # Center coordinates in the margin area for ranks (left/right)
+        for rank_index, rank_char in enumerate(rank_labels):
+            y = rank_index * SQUARE_SIZE + margin + SQUARE_SIZE // 2 - coord_size // 2 + offset
+            x_left = margin // 2 - coord_size // 2 + offset
+            x_right = margin + cols * SQUARE_SIZE + margin // 2 - coord_size // 2 + offset
+            for x in (x_left, x_right):
+                labels.append((rank_char, x, y))
+        labels = [(label, x, y) for label, x, y in labels if label in COORD_SVG_PATHS]
+
+        # Define each glyph once and place it with <use>
+        svg.open("defs")
+        for label in dict.fromkeys(label for label, _, _ in labels):
+            svg.open("g", {"id": "%scoord-%s" % (prefix, label), "fill": text_color, "stroke": text_color})
+            svg.fragment(COORD_SVG_PATHS[label])
+            svg.close()
+        svg.close()
+        for label, x, y in labels:
+            svg.element("use", {
+                "xlink:href": "#%scoord-%s" % (prefix, label),
+                "transform": f"translate({x},{y}) scale({coord_size/32.0})",
+            })
+
+    return svg.tostring()
+
+
+def _arrows(svg, board, arrows, orientation, colors, offset):
+    """Adds arrows and circles to the document being built."""
+    geometry = _geometry(board.rows, board.cols, orientation, offset)
+    for arrow in arrows:
+        try:
+            tail, head, color = arrow.tail, arrow.head, arrow.color  # type: ignore
+        except AttributeError:
+            tail, head = arrow  # type: ignore
+            color = "green"
+
+        try:
+            color, opacity = _select_color(colors or {}, " ".join(["arrow", color]))
+        except KeyError:
+            opacity = 1.0
+
+        xtail, ytail = geometry.anchor(tail)
+        xhead, yhead = geometry.anchor(head)
+
+        if (xhead, yhead) == (xtail, ytail):
+            svg.element("circle", _attrs({
+                "cx": xhead,
+                "cy": yhead,
+                "r": SQUARE_SIZE * 0.93 / 2,
+                "stroke-width": SQUARE_SIZE * 0.07,
+                "stroke": color,
+                "opacity": opacity if opacity < 1.0 else None,
+                "fill": "none",
+                "class": "circle",
+            }))
+        else:
+            marker_size = 0.6 * SQUARE_SIZE
+            marker_margin = 0.1 * SQUARE_SIZE
+
+            dx, dy = xhead - xtail, yhead - ytail
+            hypot = math.hypot(dx, dy)
+
+            shaft_x = xhead - dx * (marker_size + marker_margin) / hypot
+            shaft_y = yhead - dy * (marker_size + marker_margin) / hypot
+
+            xtip = xhead - dx * marker_margin / hypot
+            ytip = yhead - dy * marker_margin / hypot
+
+            svg.element("line", _attrs({
+                "x1": xtail,
+                "y1": ytail,
+                "x2": shaft_x,
+                "y2": shaft_y,
+                "stroke": color,
+                "opacity": opacity if opacity < 1.0 else None,
+                "stroke-width": SQUARE_SIZE * 0.2,
+                "stroke-linecap": "butt",
+                "class": "arrow",
+            }))
+
+            marker = [(xtip, ytip),
+                      (shaft_x + dy * 0.5 * marker_size / hypot,
+                       shaft_y - dx * 0.5 * marker_size / hypot),
+                      (shaft_x - dy * 0.5 * marker_size / hypot,
+                       shaft_y + dx * 0.5 * marker_size / hypot)]
+
+            svg.element("polygon", _attrs({
+                "points": " ".join(f"{x},{y}" for x, y in marker),
+                "fill": color,
+                "opacity": opacity if opacity < 1.0 else None,
+                "class": "arrow",
+            }))
+
+
+def board(css, board=None, orientation=True, flipped=False, check=None, lastmove=None, arrows=(), squares=None, width=None, height=None, colors=None, coordinates=False, borders=False, background_image=None, rotate_opponent=False, engine="etree", compact=False, sprite_url=None, background_url=None):
+    """
+    Renders a board with pieces and markup as an SVG image.
+
+    *engine* selects how the document is assembled: ``"etree"`` builds an
+    :mod:`xml.etree.ElementTree` tree and serializes it, ``"template"``
+    appends serialized fragments to a single buffer, which is considerably
+    faster. Both produce equivalent documents.
+
+    With *compact*, the checkerboard is drawn as a single rect filled with a
+    pattern instead of one rect per square, which makes the document smaller
+    and cheaper to parse and rasterize.
+
+    With *sprite_url*, pieces are referenced from that document (see
+    :func:`sprites()`) instead of being defined in the board document, and
+    with *background_url*, a PNG/JPG *background_image* is referenced from
+    that URL instead of being embedded.
+    """
+    try:
+        builder_cls = ENGINES[engine]
+    except KeyError:
+        raise ValueError("unknown svg engine: %r" % engine)
+
+    orientation ^= flipped
+    inner_border = 1 if borders and coordinates else 0
+    outer_border = 1 if borders else 0
+    margin = 15 if coordinates else 0
+    # full_size = 2 * outer_border + 2 * margin + 2 * inner_border + 8 * SQUARE_SIZE
+
+    # Include the margin for coordinates in the viewBox and size
+    total_width = board.cols * SQUARE_SIZE + 2 * margin
+    total_height = board.rows * SQUARE_SIZE + 2 * margin
+    svg_attrs = {
+        "xmlns": "http://www.w3.org/2000/svg",
+        "version": "1.1",
+        "xmlns:xlink": "http://www.w3.org/1999/xlink",
+        "viewBox": "0 0 %d %d" % (total_width, total_height),
+    }
+    if width is not None:
+        svg_attrs["width"] = str(total_width if coordinates else width)
+    if height is not None:
+        svg_attrs["height"] = str(total_height if coordinates else height)
+
+    svg = builder_cls(svg_attrs)
+    if colors:
+        svg.element("style", {}, _colors_to_css(colors))
+
+    svg.open("defs")
+    if board and not sprite_url:
+        # Only define the pieces that are actually on the board.
+        _piece_defs(svg, css, board.pieces.values(), builder_cls)
+    if squares:
+        svg.fragment(XX)
+    if check is not None:
+        svg.fragment(CHECK_GRADIENT)
+    svg.close()
+
+    scale = 1.0
+    if not coordinates and (width or height):
+        scale = min(size / total for size, total in ((width, total_width), (height, total_height)) if size)
+    render_squares = _board_background(svg, board, background_image, background_url, margin, scale)
+
+    # The squares and coordinates only depend on the geometry of the board
+    svg.fragment(_board_layer(board.rows, board.cols, orientation, coordinates, render_squares, compact))
+
+    _board_markup(svg, css, board, orientation, check, lastmove, squares, arrows, colors, rotate_opponent,
+                  sprite_url, render_squares, margin, outer_border + margin + inner_border)
+
+    return SvgWrapper(svg.tostring())
+
+
+def _piece_defs(svg, css, pieces, builder_cls):
+    """Adds the definitions of the given pieces to the document being built."""
+    for symbol in dict.fromkeys(piece.symbol for piece in pieces):
+        if SVG_PIECES.get(css, {}).get(symbol):
+            svg.fragment(SVG_PIECES[css][symbol], _piece_element(css, symbol) if builder_cls is _TreeBuilder else None)
+
+
+def _board_background(svg, board, background_image, background_url, margin, scale):
+    """
+    Adds the background image of a board to the document being built. Returns
+    whether the squares still have to be drawn.
+    """
+    if not background_image:
+        return True
+
+    bg_version = asset_version(os.path.join("images", "board", background_image))
+    if _background_path(background_image) is None:
+        pass  # Reported when it was found missing
+    elif background_image.lower().endswith('.svg'):
+        # Embed SVG background directly
+        try:
+            svg.fragment(_background_svg(background_image, bg_version, board.rows, board.cols, margin))
+        except Exception as e:
+            print(f"ERROR: Could not embed SVG background: {e}")
+    else:
+        # Use <image> for PNG/JPG, embed as data URI at the pixel size of the board
+        try:
+            svg.element("image", {
+                "xlink:href": background_url or _background_data_uri(background_image, bg_version,
+                                                                     max(1, round(board.cols * SQUARE_SIZE * scale)),
+                                                                     max(1, round(board.rows * SQUARE_SIZE * scale))),
+                "x": str(margin),
+                "y": str(margin),
+                "width": str(board.cols * SQUARE_SIZE),
+                "height": str(board.rows * SQUARE_SIZE),
+                "preserveAspectRatio": "none"
+            })
+        except Exception as e:
+            print(f"ERROR: Could not embed PNG/JPG background: {e}")
+    return False
+
+
+def _board_markup(svg, css, board, orientation, check, lastmove, squares, arrows, colors, rotate_opponent, sprite_url, render_squares, margin, offset):
+    """
+    Adds everything that is drawn on top of the squares to the document being
+    built: highlights, pieces and arrows. The definitions they reference are
+    expected in the document.
+    """
+    geometry = _geometry(board.rows, board.cols, orientation, margin)
+
+    # Render highlights on top of the squares, only if not using a background image
+    if render_squares:
+        if lastmove:
+            for row, col in dict.fromkeys((geometry.square(lastmove.from_square), geometry.square(lastmove.to_square))):
+                if 0 <= row < board.rows and 0 <= col < board.cols:
+                    x, y = geometry.origins[row][col]
+                    cls = "square %s lastmove" % ("light" if col % 2 == row % 2 else "dark")
+                    svg.element("rect", {
+                        "x": str(x),
+                        "y": str(y),
+                        "width": str(SQUARE_SIZE),
+                        "height": str(SQUARE_SIZE),
+                        "class": cls,
+                        "stroke": "none",
+                        "fill": DEFAULT_COLORS[cls],
+                    })
+
+        # Render selected squares.
+        if squares:
+            for row, col in dict.fromkeys(geometry.square(square) for square in squares):
+                if 0 <= row < board.rows and 0 <= col < board.cols:
+                    x, y = geometry.origins[row][col]
+                    svg.element("use", _attrs({
+                        "href": "#xx",
+                        "xlink:href": "#xx",
+                        "x": x,
+                        "y": y,
+                    }))
+
+    # Render pieces
+    check_square = geometry.square(check) if check is not None else None
+    if board is not None:
+        for row, col, x, y in geometry.layout:
+            piece = board.piece_at(row, col)
+            if piece:
+                # Render check mark.
+                if check_square == (row, col):
+                    svg.element("rect", _attrs({
+                        "x": x,
+                        "y": y,
+                        "width": SQUARE_SIZE,
+                        "height": SQUARE_SIZE,
+                        "class": "check",
+                        "fill": "url(#check_gradient)",
+                    }))
+
+                color = pychess.COLOR_NAMES[piece.color]
+                href = "%s#%s-%s-piece" % (sprite_url or "", color, piece.symbol)
+                # Apply 180-degree rotation to opponent pieces if requested
+                transform = f"translate({x}, {y})"
+                if rotate_opponent:
+                    # Determine if this is an opponent piece (relative to orientation)
+                    is_opponent = (piece.color != (1 if orientation else 0))
+                    if is_opponent:
+                        # Center of the square
+                        cx = x + SQUARE_SIZE / 2
+                        cy = y + SQUARE_SIZE / 2
+                        transform = f"translate({cx},{cy}) rotate(180) translate({-SQUARE_SIZE/2},{-SQUARE_SIZE/2})"
+                svg.element("use", {
+                    "xlink:href": href,
+                    "transform": transform,
+                })
+
+    # Render arrows.
+    _arrows(svg, board, arrows, orientation, colors, offset)
+
+
+def sheet(css, boards, columns=None, gap=0, orientation=True, flipped=False, width=None, height=None, colors=None, coordinates=False, background_image=None, rotate_opponent=False, engine="etree", compact=False):
+    """
+    Renders several boards in a grid as a single SVG image, e.g., a page of
+    diagrams.
+
+    *boards* are :class:`pychess.Board` instances, or dicts with a ``board``
+    and optionally its ``lastmove``, ``check``, ``arrows`` and ``squares``.
+    The boards are laid out in *columns* columns (default: a square grid),
+    *gap* units apart. *width* and *height* are the size of each board. The
+    other arguments apply to all boards, like for :func:`board()`.
+
+    The pieces are defined once for the whole sheet, and the squares,
+    coordinates and background once per board size.
+    """
+    try:
+        builder_cls = ENGINES[engine]
+    except KeyError:
+        raise ValueError("unknown svg engine: %r" % engine)
+
+    boards = [item if isinstance(item, dict) else {"board": item} for item in boards]
+    if not boards:
+        raise ValueError("no boards")
+
+    orientation ^= flipped
+    margin = 15 if coordinates else 0
+    columns = min(columns or math.ceil(math.sqrt(len(boards))), len(boards))
+    rows = math.ceil(len(boards) / columns)
+
+    # All boards get a cell of the same size.
+    board_width = max(item["board"].cols for item in boards) * SQUARE_SIZE + 2 * margin
+    board_height = max(item["board"].rows for item in boards) * SQUARE_SIZE + 2 * margin
+    if width is None and height is None:
+        cell_width, cell_height = board_width, board_height
+    else:
+        cell_width = width or round(height * board_width / board_height)
+        cell_height = height or round(width * board_height / board_width)
+    total_width = columns * cell_width + (columns - 1) * gap
+    total_height = rows * cell_height + (rows - 1) * gap
+
+    svg_attrs = {
+        "xmlns": "http://www.w3.org/2000/svg",
+        "version": "1.1",
+        "xmlns:xlink": "http://www.w3.org/1999/xlink",
+        "viewBox": "0 0 %d %d" % (total_width, total_height),
+    }
+    if width is not None or height is not None:
+        svg_attrs["width"] = str(total_width)
+        svg_attrs["height"] = str(total_height)
+
+    svg = builder_cls(svg_attrs)
+    if colors:
+        svg.element("style", {}, _colors_to_css(colors))
+
+    svg.open("defs")
+    _piece_defs(svg, css, (piece for item in boards for piece in item["board"].pieces.values()), builder_cls)
+    if any(item.get("squares") for item in boards):
+        svg.fragment(XX)
+    if any(item.get("check") is not None for item in boards):
+        svg.fragment(CHECK_GRADIENT)
+
+    # The background, squares and coordinates of each board size, referenced
+    # by all boards of that size.
+    layers = {}
+    for item in boards:
+        shape = item["board"].rows, item["board"].cols
+        if shape in layers:
+            continue
+        layer = "board-%dx%d" % shape
+        scale = min(cell_width / (shape[1] * SQUARE_SIZE + 2 * margin), cell_height / (shape[0] * SQUARE_SIZE + 2 * margin))
+        svg.open("g", {"id": layer})
+        render_squares = _board_background(svg, item["board"], background_image, None, margin, scale)
+        svg.fragment(_board_layer(shape[0], shape[1], orientation, coordinates, render_squares, compact, layer + "-"))
+        svg.close()
+        layers[shape] = layer, render_squares
+    svg.close()
+
+    for index, item in enumerate(boards):
+        board = item["board"]
+        layer, render_squares = layers[(board.rows, board.cols)]
+        svg.open("svg", {
+            "x": str((index % columns) * (cell_width + gap)),
+            "y": str((index // columns) * (cell_height + gap)),
+            "width": str(cell_width),
+            "height": str(cell_height),
+            "viewBox": "0 0 %d %d" % (board.cols * SQUARE_SIZE + 2 * margin, board.rows * SQUARE_SIZE + 2 * margin),
+        })
+        svg.element("use", {"xlink:href": "#" + layer})
+        _board_markup(svg, css, board, orientation, item.get("check"), item.get("lastmove"), item.get("squares"), item.get("arrows", ()),
+                      colors, rotate_opponent, None, render_squares, margin, margin)
+        svg.close()
+
+    return SvgWrapper(svg.tostring())
+
+
+def sprites(css):
+    """
+    Renders an SVG document that defines all pieces of a piece set, to be
+    referenced by boards rendered with *sprite_url*. Returns ``None`` if the
+    piece set does not exist.
+    """
+    load_piece_set(css)
+    if not SVG_PATH_PIECES[css]:
+        return None
+
+    svg = _TemplateBuilder({
+        "xmlns": "http://www.w3.org/2000/svg",
+        "version": "1.1",
+        "xmlns:xlink": "http://www.w3.org/1999/xlink",
+    })
+    svg.open("defs")
+    for symbol, piece_svg in sorted(SVG_PIECES[css].items()):
+        if piece_svg:
+            svg.fragment(piece_svg)
+    return SvgWrapper(svg.tostring())
+
+
+def arrows(board, arrows, orientation=True, flipped=False, width=None, height=None, colors=None, coordinates=False):
+    """
+    Renders only the arrows and circles of a board as a transparent SVG image,
+    aligned with the image :func:`board()` renders with the same arguments.
+    """
+    orientation ^= flipped
+    margin = 15 if coordinates else 0
+    total_width = board.cols * SQUARE_SIZE + 2 * margin
+    total_height = board.rows * SQUARE_SIZE + 2 * margin
+    svg = _TemplateBuilder(_attrs({
+        "xmlns": "http://www.w3.org/2000/svg",
+        "version": "1.1",
+        "viewBox": "0 0 %d %d" % (total_width, total_height),
+        "width": None if width is None else (total_width if coordinates else width),
+        "height": None if height is None else (total_height if coordinates else height),
+    }))
+    _arrows(svg, board, arrows, orientation, colors, margin)
+    return SvgWrapper(svg.tostring())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompiles piece sets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build-pieces", help="bundle piece sets into a single file")
+    build.add_argument("--output", "-o", default="pieces.bundle", help="bundle file (default: pieces.bundle)")
+    build.add_argument("--precision", type=int, default=PIECE_PRECISION, help="decimals of piece coordinates (default: %d)" % PIECE_PRECISION)
+    build.add_argument("css", nargs="*", help="piece sets, e.g., standard/standard (default: all)")
+    args = parser.parse_args()
+
+    PIECE_PRECISION = args.precision
+    build_bundle(args.output, args.css or None)
@@ -20,126 +20,676 @@
 """An HTTP service that renders chess board images"""
 
 import argparse
+import asyncio
+import base64
+import collections
+import concurrent.futures
+import hashlib
 import aiohttp.web
+import functools
 import pychess
+import pychess_raster
 import pychess_svg
 import cairosvg
 import json
+import mimetypes
 import os
+import typing
+import urllib.parse
+
+
+def theme_path(name):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{name}.json")
 
 
 def load_theme(name):
-    with open(os.path.join(os.path.dirname(__file__), f"{name}.json")) as f:
+    with open(theme_path(name)) as f:
         return json.load(f)
 
 
 THEMES = {name: load_theme(name) for name in ["wikipedia", "lichess-blue", "lichess-brown"]}
 
+THEME_FILES = {name: os.stat(theme_path(name)) for name in THEMES}
 
-class Service:
-    def make_svg(self, request):
-        css = request.query.get("css", "standard_standard").replace("_", "/", 1)
-        fen = request.query["fen"].replace(".", "+")
-        background_image = request.query.get("background_image")
-        print(css, fen, background_image)
+RASTER_BACKENDS = ["vector", "sprite"]
+
+MAX_ANIMATION_PLIES = 500
+
+# Animation frames are kept until they are encoded, so the number of frames
+# times their size is limited, e.g., 500 plies at 360 pixels.
+MAX_ANIMATION_PIXELS = 64 * 1024 * 1024
+
+ANIMATION_CONTENT_TYPES = {"gif": "image/gif", "webp": "image/webp", "png": "image/png"}
+
+THEME_VERSIONS = {name: hashlib.sha1(json.dumps(theme, sort_keys=True).encode("utf-8")).hexdigest()[:8] for name, theme in THEMES.items()}
+
+
+class LRUCache:
+    """
+    A least recently used cache of response bodies, bounded by the total
+    number of bytes stored.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
         try:
-            board = pychess.Board(fen, css)
+            value = self.entries[key]
         except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self.entries[key] = value
+        self.size += len(value)
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def rasterize(svg_data):
+    """Converts an SVG document to PNG. Runs in the raster worker processes."""
+    return cairosvg.svg2png(bytestring=svg_data)
+
+
+class BoardRequest(typing.NamedTuple):
+    """
+    The canonical form of the board parameters of a request.
+
+    All spellings of the same image (``size`` vs. ``width`` and ``height``,
+    ``lastMove`` vs. ``lastmove``, ``.`` vs. ``+`` in the FEN, additional
+    FEN fields, default values, ...) map to the same, hashable instance.
+    """
+    css: str
+    fen: str
+    width: int
+    height: int
+    flipped: bool
+    lastmove: typing.Optional[str]
+    check: typing.Optional[str]
+    arrows: typing.Tuple[str, ...]
+    squares: typing.Tuple[str, ...]
+    coordinates: typing.Optional[str]
+    colors: str
+    background_image: typing.Optional[str]
+    rotate_opponent: bool
+    raster: typing.Optional[str]
+    linked: bool
+
+    @classmethod
+    def from_query(cls, query):
+        """Validates the board parameters of a query and normalizes them."""
+        css = query.get("css", "standard_standard").replace("_", "/", 1)
+        try:
+            fen = query["fen"].replace(".", "+").split()[0]  # Ignore any additional FEN parts
+        except (KeyError, IndexError):
             raise aiohttp.web.HTTPBadRequest(reason="fen required")
-        #except ValueError:
-        #    raise aiohttp.web.HTTPBadRequest(reason="invalid fen")
+        background_image = query.get("background_image") or None
+        print(css, fen, background_image)
 
         # Handle 'size' parameter for square images, fallback to width/height
         try:
-            size = min(max(int(request.query.get("size", 360)), 16), 1024)
+            size = min(max(int(query.get("size", 360)), 16), 1024)
         except ValueError:
             raise aiohttp.web.HTTPBadRequest(reason="size is not a number")
         try:
-            width = min(max(int(request.query.get("width", size)), 16), 1024)
+            width = min(max(int(query.get("width", size)), 16), 1024)
         except ValueError:
             raise aiohttp.web.HTTPBadRequest(reason="width is not a number")
         try:
-            height = min(max(int(request.query.get("height", size)), 16), 1024)
+            height = min(max(int(query.get("height", size)), 16), 1024)
         except ValueError:
             raise aiohttp.web.HTTPBadRequest(reason="height is not a number")
 
         try:
-            uci = request.query.get("lastMove") or request.query["lastmove"]
-            lastmove = pychess.Move.from_uci(uci)
+            lastmove = query.get("lastMove") or query["lastmove"]
+            pychess.Move.from_uci(lastmove)
         except KeyError:
             lastmove = None
-        except ValueError:
+        except (ValueError, IndexError):
             raise aiohttp.web.HTTPBadRequest(reason="lastMove is not a valid uci move")
 
-        try:
-            check = request.query["check"]
-        except KeyError:
-            check = None
-        except ValueError:
-            raise aiohttp.web.HTTPBadRequest(reason="check is not a valid square name")
+        check = query.get("check") or None
 
         try:
-            arrows = [pychess.Arrow.from_pgn(s.strip()) for s in request.query.get("arrows", "").split(",") if s.strip()]
+            arrows = tuple(pychess.Arrow.from_pgn(s.strip()).pgn() for s in query.get("arrows", "").split(",") if s.strip())
         except ValueError:
             raise aiohttp.web.HTTPBadRequest(reason="invalid arrow")
 
-        try:
-            squares = [s.strip() for s in request.query.get("squares", "").split(",") if s.strip()]
-        except ValueError:
-            raise aiohttp.web.HTTPBadRequest(reason="invalid squares")
+        # Marked squares are drawn once each, in no particular order.
+        squares = tuple(sorted(set(s.strip() for s in query.get("squares", "").split(",") if s.strip())))
 
-        flipped = request.query.get("orientation", "white") == "black"
+        flipped = query.get("orientation", "white") == "black"
 
-        coordinates = request.query.get("coordinates", False)
+        coordinates = query.get("coordinates")
         if coordinates in ["", "1", "true", "True", "yes"]:
             coordinates = "standard"
         if coordinates and coordinates not in pychess.COORDS:
             raise aiohttp.web.HTTPBadRequest(reason="invalid coordinates")
+        coordinates = coordinates or None
 
-        try:
-            colors = THEMES[request.query.get("colors", "lichess-brown")]
-        except KeyError:
+        colors = query.get("colors", "lichess-brown")
+        if colors not in THEMES:
             raise aiohttp.web.HTTPBadRequest(reason="theme colors not found")
 
         # Handle rotate_opponent parameter
-        rotate_opponent = request.query.get("rotate_opponent", "false").lower() in ["1", "true", "yes"]
-
-        return pychess_svg.board(
-            css,
-            board,
-            coordinates=coordinates,
-            flipped=flipped,
-            lastmove=lastmove,
-            check=check,
-            arrows=arrows,
-            squares=squares,
-            width=width,
-            height=height,
-            colors=colors,
-            background_image=background_image,
-            rotate_opponent=rotate_opponent,
+        rotate_opponent = query.get("rotate_opponent", "false").lower() in ["1", "true", "yes"]
+
+        raster = query.get("raster") or None
+        if raster and raster not in RASTER_BACKENDS:
+            raise aiohttp.web.HTTPBadRequest(reason="invalid raster backend")
+
+        # Reference pieces and backgrounds instead of embedding them (SVG only)
+        linked = query.get("linked", "false").lower() in ["1", "true", "yes"]
+
+        return cls(css, fen, width, height, flipped, lastmove, check, arrows, squares, coordinates, colors, background_image, rotate_opponent, raster, linked)
+
+    def to_query(self):
+        """Returns the canonical query parameters, omitting default values."""
+        query = [("fen", self.fen.replace("+", "."))]
+        if self.css != "standard/standard":
+            query.append(("css", self.css.replace("/", "_", 1)))
+        if self.width == self.height:
+            if self.width != 360:
+                query.append(("size", str(self.width)))
+        else:
+            query.append(("width", str(self.width)))
+            query.append(("height", str(self.height)))
+        if self.flipped:
+            query.append(("orientation", "black"))
+        if self.lastmove:
+            query.append(("lastMove", self.lastmove))
+        if self.check:
+            query.append(("check", self.check))
+        if self.arrows:
+            query.append(("arrows", ",".join(self.arrows)))
+        if self.squares:
+            query.append(("squares", ",".join(self.squares)))
+        if self.coordinates:
+            query.append(("coordinates", self.coordinates))
+        if self.colors != "lichess-brown":
+            query.append(("colors", self.colors))
+        if self.background_image:
+            query.append(("background_image", self.background_image))
+        if self.rotate_opponent:
+            query.append(("rotate_opponent", "true"))
+        if self.raster:
+            query.append(("raster", self.raster))
+        if self.linked:
+            query.append(("linked", "1"))
+        return query
+
+    def for_format(self, fmt):
+        """Drops the parameters that images in the format *fmt* ignore."""
+        return self._replace(raster=None) if fmt == "svg" else self._replace(linked=False)
+
+
+class SheetRequest(typing.NamedTuple):
+    """The canonical form of the parameters of a sheet of boards."""
+    boards: typing.Tuple[BoardRequest, ...]
+    columns: int
+    gap: int
+
+
+class AnimationRequest(typing.NamedTuple):
+    """The canonical form of the parameters of an animation."""
+    board: BoardRequest
+    color: bool
+    moves: typing.Tuple[str, ...]
+    duration: int
+
+
+class Service:
+    def __init__(self, raster_workers=0, raster_queue=None, cache_size=64 * 1024 * 1024,
+                 canonical_redirect=False, max_age=86400, svg_engine="template", compact_board=False,
+                 raster_backend="vector", asset_url="/", max_batch=64):
+        self.canonical_redirect = canonical_redirect
+        self.max_batch = max_batch
+        self.asset_url = asset_url
+        self.raster_backend = raster_backend
+        self.svg_engine = svg_engine
+        self.compact_board = compact_board
+        self.max_age = max_age
+
+        # SVG and PNG bodies are stored under separate keys in one cache.
+        self.cache = LRUCache(cache_size)
+
+        # With raster_workers == 0 PNGs are rasterized on the event loop.
+        self.raster_pool = concurrent.futures.ProcessPoolExecutor(raster_workers) if raster_workers else None
+        self.raster_queue = raster_queue if raster_queue is not None else 4 * max(raster_workers, 1)
+        self.raster_pending = 0
+
+    async def raster(self, func, *args, **kwargs):
+        """Runs a rasterization function in the raster pool."""
+        call = functools.partial(func, *args, **kwargs)
+        if self.raster_pool is None:
+            return call()
+
+        # Bound the number of PNGs waiting for a worker, so that a burst of
+        # PNG requests cannot queue up unlimited work and memory.
+        if self.raster_pending >= self.raster_queue:
+            raise aiohttp.web.HTTPServiceUnavailable(reason="too many pending png renders")
+
+        self.raster_pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.raster_pool, call)
+        finally:
+            self.raster_pending -= 1
+
+    async def close(self, app):
+        if self.raster_pool is not None:
+            self.raster_pool.shutdown()
+
+    def board_request(self, query):
+        # Missing assets may have appeared, which changes the asset versions
+        # of the entity tag and cache key, even if the image is cached.
+        pychess_svg.expire_missing()
+        params = BoardRequest.from_query(query)
+        if params.raster == self.raster_backend:
+            params = params._replace(raster=None)
+        return params
+
+    def parse_request(self, request, fmt):
+        params = self.board_request(request.query).for_format(fmt)
+
+        if self.canonical_redirect:
+            query = params.to_query()
+            if list(request.query.items()) != query:
+                raise aiohttp.web.HTTPMovedPermanently(request.rel_url.with_query(query))
+
+        return params
+
+    def parse_sheet(self, request):
+        """
+        Parses a sheet request: one board per ``fen`` parameter, all other
+        board parameters are shared.
+        """
+        fens = request.query.getall("fen", [])
+        if not fens:
+            raise aiohttp.web.HTTPBadRequest(reason="fen required")
+        if len(fens) > self.max_batch:
+            raise aiohttp.web.HTTPBadRequest(reason=f"more than {self.max_batch} boards")
+        query = dict(request.query)
+        boards = tuple(self.board_request(dict(query, fen=fen))._replace(raster=None, linked=False) for fen in fens)
+
+        try:
+            columns = min(max(int(request.query.get("columns", 0)), 0), len(boards))
+        except ValueError:
+            raise aiohttp.web.HTTPBadRequest(reason="columns is not a number")
+        try:
+            gap = min(max(int(request.query.get("gap", 0)), 0), 256)
+        except ValueError:
+            raise aiohttp.web.HTTPBadRequest(reason="gap is not a number")
+
+        return SheetRequest(boards, columns, gap)
+
+    def parse_animation(self, request):
+        """
+        Parses an animation request: the board parameters of the start
+        position, whose FEN may include the side to move, and the moves.
+        """
+        params = self.board_request(request.query)._replace(check=None, arrows=(), squares=(), raster=None, linked=False)
+        fields = request.query["fen"].split()
+        color = not (len(fields) > 1 and fields[1] == "b")
+
+        moves = tuple(move for move in request.query.get("moves", "").replace(",", " ").split())
+        if len(moves) > MAX_ANIMATION_PLIES:
+            raise aiohttp.web.HTTPBadRequest(reason=f"more than {MAX_ANIMATION_PLIES} moves")
+        for move in moves:
+            try:
+                if pychess.Move.from_uci(move) is None:
+                    raise ValueError(move)
+            except (ValueError, IndexError):
+                raise aiohttp.web.HTTPBadRequest(reason="invalid uci move: %s" % move)
+        if (len(moves) + 1) * params.width * params.height > MAX_ANIMATION_PIXELS:
+            raise aiohttp.web.HTTPBadRequest(reason="too many moves for the image size")
+
+        try:
+            duration = min(max(int(request.query.get("duration", 500)), 20), 10000)
+        except ValueError:
+            raise aiohttp.web.HTTPBadRequest(reason="duration is not a number")
+
+        return AnimationRequest(params, color, moves, duration)
+
+    def animation_etag(self, fmt, animation):
+        tag = self.etag(fmt, animation.board)
+        return hashlib.sha1(repr((fmt, animation.color, animation.moves, animation.duration, tag)).encode("utf-8")).hexdigest()[:20]
+
+    def sheet_etag(self, fmt, sheet):
+        tags = [self.etag(fmt, params) for params in sheet.boards]
+        return hashlib.sha1(repr((fmt, sheet.columns, sheet.gap, tags)).encode("utf-8")).hexdigest()[:20]
+
+    def asset_versions(self, params):
+        """Returns the versions of the static assets used by a board image."""
+        versions = (pychess_svg.piece_set_version(params.css), THEME_VERSIONS[params.colors])
+        if params.background_image:
+            versions += (pychess_svg.asset_version(os.path.join("images", "board", params.background_image)),)
+        return versions
+
+    def etag(self, fmt, params):
+        """
+        Returns an entity tag for the image described by *params*. Images are
+        pure functions of the parameters and the static assets they use.
+        """
+        return hashlib.sha1(repr((fmt, params, self.asset_versions(params))).encode("utf-8")).hexdigest()[:20]
+
+    def cache_headers(self, request, etag, immutable=False):
+        """Returns validator headers, or responds 304 if the client has the image."""
+        headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": "public, max-age=31536000, immutable" if immutable else f"public, max-age={self.max_age}",
+        }
+        if any(tag.value in (etag, "*") for tag in request.if_none_match or ()):
+            raise aiohttp.web.HTTPNotModified(headers=headers)
+        return headers
+
+    def board_args(self, params):
+        """Returns the arguments for rendering a board with the given parameters."""
+        try:
+            board = pychess.Board(params.fen, params.css)
+        except ValueError as e:
+            raise aiohttp.web.HTTPBadRequest(reason="invalid fen: %s" % e)
+        return {
+            "css": params.css,
+            "board": board,
+            "coordinates": params.coordinates,
+            "flipped": params.flipped,
+            "lastmove": pychess.Move.from_uci(params.lastmove) if params.lastmove else None,
+            "check": params.check,
+            "arrows": [pychess.Arrow.from_pgn(s) for s in params.arrows],
+            "squares": list(params.squares),
+            "width": params.width,
+            "height": params.height,
+            "colors": THEMES[params.colors],
+            "background_image": params.background_image,
+            "rotate_opponent": params.rotate_opponent,
+            "compact": self.compact_board,
+        }
+
+    def make_svg(self, params):
+        kwargs = self.board_args(params)
+        if params.linked:
+            kwargs["sprite_url"] = "%ssprites/%s.svg?v=%s" % (self.asset_url, urllib.parse.quote(params.css), pychess_svg.piece_set_version(params.css))
+            if params.background_image:
+                version = pychess_svg.asset_version(os.path.join("images", "board", params.background_image))
+                kwargs["background_url"] = "%sbackgrounds/%s?v=%s" % (self.asset_url, urllib.parse.quote(params.background_image), version)
+        return pychess_svg.board(engine=self.svg_engine, **kwargs)
+
+    async def make_png(self, params):
+        if (params.raster or self.raster_backend) == "sprite":
+            return await self.raster(pychess_raster.board_png, **self.board_args(params))
+        return await self.raster(rasterize, self.make_svg(params).encode("utf-8"))
+
+    def make_sheet_svg(self, sheet):
+        boards = [self.board_args(params) for params in sheet.boards]
+        shared = boards[0]
+        return pychess_svg.sheet(
+            shared["css"],
+            [{key: args[key] for key in ("board", "lastmove", "check", "arrows", "squares")} for args in boards],
+            columns=sheet.columns or None,
+            gap=sheet.gap,
+            engine=self.svg_engine,
+            **{key: shared[key] for key in ("flipped", "width", "height", "colors", "coordinates", "background_image", "rotate_opponent", "compact")},
         )
 
+    def svg_data(self, params):
+        key = ("svg", params, self.asset_versions(params))
+        svg_data = self.cache.get(key)
+        if svg_data is None:
+            svg_data = self.make_svg(params).encode("utf-8")
+            self.cache.put(key, svg_data)
+        return svg_data
+
+    async def png_data(self, params):
+        key = ("png", params, self.asset_versions(params))
+        png_data = self.cache.get(key)
+        if png_data is None:
+            png_data = await self.make_png(params)
+            self.cache.put(key, png_data)
+        return png_data
+
     async def render_svg(self, request):
-        return aiohttp.web.Response(text=self.make_svg(request), content_type="image/svg+xml")
+        params = self.parse_request(request, "svg")
+        headers = self.cache_headers(request, self.etag("svg", params))
+        return aiohttp.web.Response(body=self.svg_data(params), content_type="image/svg+xml", charset="utf-8", headers=headers)
 
     async def render_png(self, request):
-        svg_data = self.make_svg(request)
-        if isinstance(svg_data, str):
-            svg_data = svg_data.encode("utf-8")
-        png_data = cairosvg.svg2png(bytestring=svg_data)
-        return aiohttp.web.Response(body=png_data, content_type="image/png")
+        params = self.parse_request(request, "png")
+        headers = self.cache_headers(request, self.etag("png", params))
+        return aiohttp.web.Response(body=await self.png_data(params), content_type="image/png", headers=headers)
+
+    async def render_sheet_svg(self, request):
+        sheet = self.parse_sheet(request)
+        headers = self.cache_headers(request, self.sheet_etag("svg", sheet))
+        key = ("sheet.svg", sheet, tuple(self.asset_versions(params) for params in sheet.boards))
+        svg_data = self.cache.get(key)
+        if svg_data is None:
+            svg_data = self.make_sheet_svg(sheet).encode("utf-8")
+            self.cache.put(key, svg_data)
+        return aiohttp.web.Response(body=svg_data, content_type="image/svg+xml", charset="utf-8", headers=headers)
+
+    async def render_sheet_png(self, request):
+        sheet = self.parse_sheet(request)
+        headers = self.cache_headers(request, self.sheet_etag("png", sheet))
+        key = ("sheet.png", sheet, tuple(self.asset_versions(params) for params in sheet.boards))
+        png_data = self.cache.get(key)
+        if png_data is None:
+            # The whole sheet is rasterized in one pass.
+            png_data = await self.raster(rasterize, self.make_sheet_svg(sheet).encode("utf-8"))
+            self.cache.put(key, png_data)
+        return aiohttp.web.Response(body=png_data, content_type="image/png", headers=headers)
+
+    async def render_animation(self, request):
+        fmt = request.match_info["fmt"]
+        animation = self.parse_animation(request)
+        headers = self.cache_headers(request, self.animation_etag(fmt, animation))
+        key = ("animation", fmt, animation, self.asset_versions(animation.board))
+        data = self.cache.get(key)
+        if data is None:
+            kwargs = self.board_args(animation.board)
+            try:
+                data = await self.raster(
+                    pychess_raster.animation,
+                    fmt=fmt,
+                    moves=[pychess.Move.from_uci(move) for move in animation.moves],
+                    color=animation.color,
+                    duration=animation.duration,
+                    **{key: kwargs[key] for key in ("css", "board", "flipped", "lastmove", "width", "height", "colors", "coordinates", "background_image", "rotate_opponent", "compact")},
+                )
+            except ValueError as e:
+                raise aiohttp.web.HTTPBadRequest(reason="illegal move: %s" % e)
+            self.cache.put(key, data)
+        return aiohttp.web.Response(body=data, content_type=ANIMATION_CONTENT_TYPES[fmt], headers=headers)
+
+    async def render_batch(self, request):
+        """
+        Renders a JSON array of board parameters, each with an optional
+        ``format`` (``png`` or ``svg``). Identical boards are rendered once.
+        Results are streamed as one JSON object per line, in the order they
+        complete, with the index of the board in the array.
+        """
+        try:
+            items = await request.json()
+        except ValueError:
+            raise aiohttp.web.HTTPBadRequest(reason="invalid json")
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise aiohttp.web.HTTPBadRequest(reason="expected an array of objects")
+        if len(items) > self.max_batch:
+            raise aiohttp.web.HTTPBadRequest(reason=f"more than {self.max_batch} boards")
+
+        response = aiohttp.web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+
+        async def write(index, result):
+            await response.write((json.dumps(dict(result, index=index)) + "\n").encode("utf-8"))
+
+        # Boards with the same canonical parameters are rendered once.
+        jobs = collections.OrderedDict()
+        for index, item in enumerate(items):
+            query = {str(key): ("true" if value else "false") if isinstance(value, bool) else str(value) for key, value in item.items()}
+            fmt = query.pop("format", "png")
+            try:
+                if fmt not in ("png", "svg"):
+                    raise aiohttp.web.HTTPBadRequest(reason="invalid format")
+                params = self.board_request(query)
+            except aiohttp.web.HTTPException as e:
+                await write(index, {"status": e.status, "error": e.reason})
+                continue
+            jobs.setdefault((fmt, params.for_format(fmt)), []).append(index)
+
+        # Do not submit more PNGs at once than the raster queue accepts.
+        limit = asyncio.Semaphore(max(self.raster_queue, 1))
+
+        async def render(fmt, params, indices):
+            try:
+                if fmt == "svg":
+                    data, content_type = self.svg_data(params), "image/svg+xml"
+                else:
+                    async with limit:
+                        data, content_type = await self.png_data(params), "image/png"
+            except aiohttp.web.HTTPException as e:
+                return indices, {"status": e.status, "error": e.reason}
+            except Exception as e:
+                return indices, {"status": 500, "error": str(e)}
+            return indices, {
+                "status": 200,
+                "content_type": content_type,
+                "etag": self.etag(fmt, params),
+                "body": base64.b64encode(data).decode("ascii"),
+            }
+
+        for result in asyncio.as_completed([render(fmt, params, indices) for (fmt, params), indices in jobs.items()]):
+            indices, result = await result
+            for index in indices:
+                await write(index, result)
+
+        await response.write_eof()
+        return response
+
+    async def render_sprites(self, request):
+        css = request.match_info["css"]
+        version = pychess_svg.piece_set_version(css)
+        headers = self.cache_headers(request, version, immutable=request.query.get("v") == version)
+        key = ("sprites", css, version)
+        svg_data = self.cache.get(key)
+        if svg_data is None:
+            svg = pychess_svg.sprites(css)
+            if svg is None:
+                raise aiohttp.web.HTTPNotFound(reason="piece set not found")
+            svg_data = svg.encode("utf-8")
+            self.cache.put(key, svg_data)
+        return aiohttp.web.Response(body=svg_data, content_type="image/svg+xml", charset="utf-8", headers=headers)
+
+    async def render_background(self, request):
+        name = request.match_info["name"]
+        path = os.path.join("images", "board", name)
+        file_path = pychess_svg.static_file(path)
+        if file_path is None:
+            raise aiohttp.web.HTTPNotFound(reason="background image not found")
+        version = pychess_svg.asset_version(path)
+        headers = self.cache_headers(request, version, immutable=request.query.get("v") == version)
+        key = ("background", name, version)
+        data = self.cache.get(key)
+        if data is None:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            self.cache.put(key, data)
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        return aiohttp.web.Response(body=data, content_type=content_type, headers=headers)
+
+    async def cache_stats(self, request):
+        return aiohttp.web.json_response(self.cache.stats())
+
+    async def manifest(self, request):
+        manifest = pychess_svg.manifest()
+        manifest["themes"] = {name: {"size": stat.st_size, "mtime": stat.st_mtime_ns / 1e9} for name, stat in THEME_FILES.items()}
+        return aiohttp.web.json_response(manifest)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--port", "-p", type=int, default=8080, help="web server port")
     parser.add_argument("--bind", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    parser.add_argument("--raster-workers", type=int, default=os.cpu_count() or 1, help="number of processes rasterizing PNGs, 0 to rasterize on the event loop (default: number of CPUs)")
+    parser.add_argument("--raster-queue", type=int, help="maximum number of pending PNG renders before responding with 503 (default: 4 per raster worker)")
+    parser.add_argument("--cache-size", type=int, default=64, help="size of the in-memory image cache in MiB, 0 to disable (default: 64)")
+    parser.add_argument("--canonical-redirect", action="store_true", help="redirect board requests to their canonical URL")
+    parser.add_argument("--max-age", type=int, default=86400, help="Cache-Control max-age of board images in seconds (default: 86400)")
+    parser.add_argument("--svg-engine", choices=sorted(pychess_svg.ENGINES), default="template", help="how SVG documents are assembled (default: template)")
+    parser.add_argument("--compact-board", action="store_true", help="draw the checkerboard with a single SVG pattern instead of one rect per square")
+    parser.add_argument("--raster-backend", choices=RASTER_BACKENDS, default="vector", help="how PNGs are rendered by default: rasterize the SVG or composite cached sprites (default: vector)")
+    parser.add_argument("--sprite-atlas", help="memory map pre-rasterized piece sprites built with 'python pychess_raster.py build-atlas' (path without extension)")
+    parser.add_argument("--preload", nargs="?", const="all", help="load all piece sets, or a comma separated list of piece sets, before accepting connections")
+    parser.add_argument("--preload-jobs", type=int, default=1, help="number of processes loading piece sets (default: 1)")
+    parser.add_argument("--piece-bundle", help="load piece sets from a bundle built with 'python pychess_svg.py build-pieces'")
+    parser.add_argument("--piece-precision", type=int, default=pychess_svg.PIECE_PRECISION, help="decimals of piece coordinates, relative to a 45 unit square (default: %d)" % pychess_svg.PIECE_PRECISION)
+    parser.add_argument("--missing-ttl", type=float, help="seconds after which missing pieces, piece sets and backgrounds are looked up again (default: never)")
+    parser.add_argument("--asset-url", default="/", help="URL prefix of /sprites and /backgrounds in SVGs requested with linked=1 (default: /)")
+    parser.add_argument("--raster-cache-size", type=int, default=64, help="size of the piece sprite cache and of the board background cache of each raster worker in MiB (default: 64)")
+    parser.add_argument("--max-batch", type=int, default=64, help="maximum number of boards per POST /boards request or sheet (default: 64)")
     args = parser.parse_args()
 
+    pychess_svg.PIECE_PRECISION = args.piece_precision
+    pychess_svg.MISSING_TTL = args.missing_ttl
+    pychess_svg.scan_assets()
+    if args.piece_bundle:
+        pychess_svg.load_bundle(args.piece_bundle)
+    if args.preload:
+        pychess_svg.preload(None if args.preload == "all" else args.preload.split(","), jobs=args.preload_jobs)
+    pychess_raster.SPRITES.max_bytes = pychess_raster.BACKGROUNDS.max_bytes = args.raster_cache_size * 1024 * 1024
+    if args.sprite_atlas:
+        pychess_raster.load_atlas(args.sprite_atlas)
+
     app = aiohttp.web.Application()
-    service = Service()
+    service = Service(
+        raster_workers=args.raster_workers,
+        raster_queue=args.raster_queue,
+        cache_size=args.cache_size * 1024 * 1024,
+        canonical_redirect=args.canonical_redirect,
+        max_age=args.max_age,
+        svg_engine=args.svg_engine,
+        compact_board=args.compact_board,
+        raster_backend=args.raster_backend,
+        asset_url=args.asset_url,
+        max_batch=args.max_batch,
+    )
+    app.on_cleanup.append(service.close)
     app.router.add_get("/board.png", service.render_png)
     app.router.add_get("/board.svg", service.render_svg)
+    app.router.add_post("/boards", service.render_batch)
+    app.router.add_get("/sheet.svg", service.render_sheet_svg)
+    app.router.add_get("/sheet.png", service.render_sheet_png)
+    app.router.add_get("/animation.{fmt:gif|webp|png}", service.render_animation)
+    app.router.add_get("/cache", service.cache_stats)
+    app.router.add_get("/manifest", service.manifest)
+    app.router.add_get("/sprites/{css:.+}.svg", service.render_sprites)
+    app.router.add_get("/backgrounds/{name:.+}", service.render_background)
 
     aiohttp.web.run_app(app, port=args.port, host=args.bind, access_log=None)
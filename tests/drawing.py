@@ -0,0 +1,328 @@
+"""
+Reduces SVG documents to what they draw, so that documents made by different
+renderers can be compared.
+"""
+
+import heapq
+import math
+import re
+import xml.etree.ElementTree as ET
+
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+XLINK_HREF = "{http://www.w3.org/1999/xlink}href"
+
+# Presentation properties inherited by children
+INHERITED = {
+    "fill", "fill-opacity", "fill-rule", "stroke", "stroke-width", "stroke-opacity", "stroke-linecap",
+    "stroke-linejoin", "stroke-miterlimit", "stroke-dasharray", "stroke-dashoffset", "font-family",
+    "font-size", "font-weight", "font-style", "text-anchor", "dominant-baseline", "visibility",
+}
+
+# Elements that only draw when referenced
+DEFINITIONS = {
+    "defs", "style", "title", "desc", "metadata", "symbol", "linearGradient", "radialGradient", "pattern",
+    "clipPath", "mask", "marker", "filter",
+}
+
+GEOMETRY = {
+    "rect": ("x", "y", "width", "height", "rx", "ry"),
+    "circle": ("cx", "cy", "r"),
+    "ellipse": ("cx", "cy", "rx", "ry"),
+    "line": ("x1", "y1", "x2", "y2"),
+    "polygon": ("points",),
+    "polyline": ("points",),
+    "path": ("d",),
+    "text": ("x", "y"),
+    "image": ("x", "y", "width", "height", "preserveAspectRatio", "href"),
+}
+
+NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+PATH_TOKEN = re.compile(r"[A-Za-z]|" + NUMBER.pattern)
+
+PATH_ARGS = {"M": 2, "L": 2, "T": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "A": 7}
+
+IDENTITY = (1, 0, 0, 1, 0, 0)
+
+
+def _value(value):
+    """Normalizes colors, numbers and lists of numbers."""
+    value = value.strip()
+    if value.startswith("#"):
+        value = value.lower()
+        return "#" + "".join(c * 2 for c in value[1:]) if len(value) in (4, 5) else value
+    tokens = PATH_TOKEN.findall(value)
+    if not tokens or "".join(tokens) != re.sub(r"[\s,]", "", value):
+        return value
+    return " ".join(token if token.isalpha() else "%g" % round(float(token), 3) for token in tokens)
+
+
+def _multiply(a, b):
+    return (
+        a[0] * b[0] + a[2] * b[1], a[1] * b[0] + a[3] * b[1],
+        a[0] * b[2] + a[2] * b[3], a[1] * b[2] + a[3] * b[3],
+        a[0] * b[4] + a[2] * b[5] + a[4], a[1] * b[4] + a[3] * b[5] + a[5],
+    )
+
+
+def _transform(value):
+    matrix = IDENTITY
+    for name, args in re.findall(r"(\w+)\s*\(([^)]*)\)", value or ""):
+        args = [float(arg) for arg in NUMBER.findall(args)]
+        if name == "translate":
+            step = (1, 0, 0, 1, args[0], args[1] if len(args) > 1 else 0)
+        elif name == "scale":
+            step = (args[0], 0, 0, args[1] if len(args) > 1 else args[0], 0, 0)
+        elif name == "rotate":
+            angle = math.radians(args[0])
+            cx, cy = args[1:3] if len(args) > 2 else (0, 0)
+            rotation = (math.cos(angle), math.sin(angle), -math.sin(angle), math.cos(angle), 0, 0)
+            step = _multiply(_multiply((1, 0, 0, 1, cx, cy), rotation), (1, 0, 0, 1, -cx, -cy))
+        elif name == "matrix":
+            step = tuple(args)
+        else:
+            raise ValueError("unsupported transform: %s" % name)
+        matrix = _multiply(matrix, step)
+    return matrix
+
+
+def _path_points(d):
+    """Returns points whose bounding box contains the path."""
+    points = []
+    x = y = start_x = start_y = 0.0
+    command = None
+    tokens = PATH_TOKEN.findall(d)
+    i = 0
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+            if command in "Zz":
+                x, y = start_x, start_y
+                continue
+        n = PATH_ARGS[command.upper()]
+        args = [float(token) for token in tokens[i:i + n]]
+        i += n
+        dx, dy = (x, y) if command.islower() else (0.0, 0.0)
+        upper = command.upper()
+        if upper == "H":
+            x = args[0] + dx
+        elif upper == "V":
+            y = args[0] + dy
+        elif upper == "A":
+            end_x, end_y = args[5] + dx, args[6] + dy
+            r = max(abs(args[0]), abs(args[1]))
+            points += [(x - 2 * r, y - 2 * r), (x + 2 * r, y + 2 * r), (end_x - 2 * r, end_y - 2 * r), (end_x + 2 * r, end_y + 2 * r)]
+            x, y = end_x, end_y
+        else:
+            pairs = [(args[k] + dx, args[k + 1] + dy) for k in range(0, n, 2)]
+            points += pairs
+            x, y = pairs[-1]
+        if upper == "M":
+            start_x, start_y = x, y
+            command = "l" if command == "m" else "L"
+        points.append((x, y))
+    return points
+
+
+def _local_box(tag, geometry, style):
+    values = dict(geometry)
+
+    def number(key):
+        return float(values.get(key) or 0)
+
+    if tag in ("rect", "image", "viewport"):
+        box = [number("x"), number("y"), number("x") + number("width"), number("y") + number("height")]
+    elif tag == "circle":
+        box = [number("cx") - number("r"), number("cy") - number("r"), number("cx") + number("r"), number("cy") + number("r")]
+    elif tag == "ellipse":
+        box = [number("cx") - number("rx"), number("cy") - number("ry"), number("cx") + number("rx"), number("cy") + number("ry")]
+    elif tag in ("line", "polygon", "polyline", "path"):
+        if tag == "line":
+            points = [(number("x1"), number("y1")), (number("x2"), number("y2"))]
+        elif tag == "path":
+            points = _path_points(values.get("d") or "")
+        else:
+            coordinates = [float(n) for n in NUMBER.findall(values.get("points") or "")]
+            points = list(zip(coordinates[0::2], coordinates[1::2]))
+        if not points:
+            return None
+        box = [min(p[0] for p in points), min(p[1] for p in points), max(p[0] for p in points), max(p[1] for p in points)]
+    elif tag == "text":
+        size = float(NUMBER.findall(str(style.get("font-size") or "16"))[0])
+        box = [number("x") - 100 * size, number("y") - 2 * size, number("x") + 100 * size, number("y") + 2 * size]
+    else:
+        return None
+    stroke = style.get("stroke")
+    if stroke not in (None, "none"):
+        width = float(NUMBER.findall(str(style.get("stroke-width") or "1"))[0])
+        box = [box[0] - width, box[1] - width, box[2] + width, box[3] + width]
+    return box
+
+
+def _box(matrix, box):
+    if box is None:
+        return (-math.inf, -math.inf, math.inf, math.inf)
+    corners = [(matrix[0] * x + matrix[2] * y + matrix[4], matrix[1] * x + matrix[3] * y + matrix[5])
+               for x in (box[0], box[2]) for y in (box[1], box[3])]
+    return (min(c[0] for c in corners), min(c[1] for c in corners), max(c[0] for c in corners), max(c[1] for c in corners))
+
+
+def _overlap(a, b):
+    return a[0] < b[2] - 1e-6 and b[0] < a[2] - 1e-6 and a[1] < b[3] - 1e-6 and b[1] < a[3] - 1e-6
+
+
+def _covers(a, b):
+    return a[0] <= b[0] + 1e-6 and a[1] <= b[1] + 1e-6 and a[2] >= b[2] - 1e-6 and a[3] >= b[3] - 1e-6
+
+
+def _opaque(shape):
+    tag, matrix, _, style, opacity, extra, _ = shape
+    style = dict(style)
+    fill = style.get("fill")
+    return (tag == "rect" and matrix[1] == matrix[2] == 0 and opacity == 1 and not extra
+            and isinstance(fill, str) and fill.startswith("#") and len(fill) == 7
+            and float(style.get("fill-opacity", 1)) == 1 and style.get("visibility", "visible") == "visible")
+
+
+def _normalize(items):
+    """
+    Drops shapes hidden by a later opaque rectangle, and orders the shapes
+    canonically, only keeping the order of shapes that overlap.
+    """
+    visible = []
+    for i, (shape, box) in enumerate(items):
+        if not any(_opaque(later) and _covers(later_box, box) for later, later_box in items[i + 1:]):
+            visible.append((shape, box))
+
+    before = [set() for _ in visible]
+    for j, (_, box) in enumerate(visible):
+        for i in range(j):
+            if _overlap(visible[i][1], box):
+                before[j].add(i)
+    after = [[] for _ in visible]
+    for j, predecessors in enumerate(before):
+        for i in predecessors:
+            after[i].append(j)
+    waiting = [len(predecessors) for predecessors in before]
+    ready = [(repr(visible[i][0]), i) for i, count in enumerate(waiting) if not count]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        _, i = heapq.heappop(ready)
+        ordered.append(visible[i][0])
+        for j in after[i]:
+            waiting[j] -= 1
+            if not waiting[j]:
+                heapq.heappush(ready, (repr(visible[j][0]), j))
+    return tuple(ordered)
+
+
+def drawing(svg):
+    """
+    Reduces an SVG document to what it draws: its size and the shapes with
+    their absolute transform, geometry and resolved paint. References,
+    classes, ids and metadata are resolved or ignored, hidden shapes are
+    dropped, and only overlapping shapes keep their painting order, so
+    that documents drawing the same picture compare equal.
+    """
+    root = ET.fromstring(svg)
+    ids = {element.get("id"): element for element in root.iter() if element.get("id")}
+
+    rules = []
+    for style in root.iter(SVG_NS + "style"):
+        for order, (selector, body) in enumerate(re.findall(r"([^{}]+)\{([^}]*)\}", style.text or "")):
+            declarations = dict((key.strip(), value.strip()) for key, value in (d.split(":", 1) for d in body.split(";") if ":" in d))
+            for part in selector.split(","):
+                classes = frozenset(re.findall(r"\.([\w-]+)", part))
+                rules.append((len(classes), order, classes, declarations))
+    rules.sort(key=lambda rule: rule[:2])
+
+    def properties(element):
+        props = {key: value for key, value in element.attrib.items() if key in INHERITED or key in ("opacity", "clip-path", "mask")}
+        classes = set((element.get("class") or "").split())
+        for _, _, selector, declarations in rules:
+            if selector and selector <= classes:
+                props.update(declarations)
+        for declaration in (element.get("style") or "").split(";"):
+            if ":" in declaration:
+                key, value = declaration.split(":", 1)
+                props[key.strip()] = value.strip()
+        return props
+
+    def paint(value, seen):
+        match = re.match(r"url\(#([^)]+)\)", value or "")
+        if not match:
+            return _value(value) if value else value
+        return definition(ids.get(match.group(1)), seen)
+
+    def href(element):
+        return element.get(XLINK_HREF) or element.get("href")
+
+    def definition(element, seen):
+        # Gradients, patterns and the like are compared by content.
+        if element is None or id(element) in seen:
+            return None
+        seen = seen | {id(element)}
+        attrs = tuple(sorted((key, paint(value, seen) if value.startswith("url(") else _value(value))
+                             for key, value in element.attrib.items() if key not in ("id", XLINK_HREF, "href")))
+        base = href(element)
+        base = definition(ids.get(base[1:]), seen) if base and base.startswith("#") else None
+        return (element.tag[len(SVG_NS):], attrs, base, tuple(definition(child, seen) for child in element if child.tag.startswith(SVG_NS)))
+
+    def walk(element, matrix, inherited, opacity, items, seen):
+        for child in element:
+            draw(child, matrix, inherited, opacity, items, seen)
+
+    def draw(element, matrix, inherited, opacity, items, seen):
+        if not element.tag.startswith(SVG_NS):
+            return
+        tag = element.tag[len(SVG_NS):]
+        if tag in DEFINITIONS:
+            return
+        props = properties(element)
+        matrix = _multiply(matrix, _transform(element.get("transform")))
+        opacity *= float(props.pop("opacity", 1))
+        inherited = dict(inherited, **{key: value for key, value in props.items() if key in INHERITED})
+        extra = tuple(sorted((key, paint(value, seen)) for key, value in props.items() if key in ("clip-path", "mask")))
+
+        if tag == "use":
+            target = href(element)
+            target = ids.get(target[1:]) if target and target.startswith("#") else None
+            if target is None or id(target) in seen:
+                items.append((("use", href(element)), _box(matrix, None)))
+                return
+            matrix = _multiply(matrix, (1, 0, 0, 1, float(element.get("x", 0)), float(element.get("y", 0))))
+            if target.tag == SVG_NS + "symbol":
+                walk(target, matrix, inherited, opacity, items, seen | {id(target)})
+            else:
+                draw(target, matrix, inherited, opacity, items, seen | {id(target)})
+        elif tag == "svg":
+            # Nested documents are compared as a whole.
+            geometry = tuple((key, _value(element.get(key))) for key in ("x", "y", "width", "height", "viewBox", "preserveAspectRatio") if element.get(key))
+            content = []
+            walk(element, IDENTITY, inherited, 1.0, content, seen)
+            shape = ("svg", tuple(round(value, 3) + 0.0 for value in matrix), geometry, _normalize(content), round(opacity, 3), extra, None)
+            items.append((shape, _box(matrix, _local_box("viewport", geometry, {}))))
+        elif tag in ("g", "a", "switch"):
+            walk(element, matrix, inherited, opacity, items, seen)
+        else:
+            geometry = []
+            for key in GEOMETRY.get(tag, ()):
+                value = href(element) if key == "href" else element.get(key)
+                if value is None and key in ("x", "y", "cx", "cy", "x1", "y1", "x2", "y2"):
+                    value = "0"
+                geometry.append((key, value if key in ("href", "preserveAspectRatio") or value is None else _value(value)))
+            style = {key: paint(value, seen) for key, value in inherited.items()}
+            style.setdefault("fill", "#000000")
+            text = "".join(element.itertext()).strip() if tag == "text" else None
+            shape = (tag, tuple(round(value, 3) + 0.0 for value in matrix), tuple(geometry), tuple(sorted(style.items())),
+                     round(opacity, 3), extra, text)
+            items.append((shape, _box(matrix, _local_box(tag, geometry, inherited))))
+
+    header = tuple((key, _value(root.get(key))) for key in ("viewBox", "width", "height") if root.get(key))
+    items = []
+    walk(root, IDENTITY, {}, 1.0, items, frozenset())
+    return header, _normalize(items)
@@ -0,0 +1,90 @@
+"""Checks parsing FENs into pychess.Board and playing moves on it"""
+
+import os
+import unittest
+
+import pychess
+import pychess_svg
+
+
+STATIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static") + os.sep
+
+CSS = "test/test"
+
+
+# (name, board fen, side to move, uci moves, board fen after the moves)
+MOVES = [
+    ("castling", "r3k2r/8/8/8/8/8/8/R3K2R", pychess.WHITE, ["e1g1", "e8c8"], "2kr3r/8/8/8/8/8/8/R4RK1"),
+    ("king takes rook", "r3k2r/8/8/8/8/8/8/R3K2R", pychess.WHITE, ["e1h1", "e8a8"], "2kr3r/8/8/8/8/8/8/R4RK1"),
+    ("castling on a large board", "r4k4r/11/11/11/11/11/11/11/11/R4K4R", pychess.WHITE, ["f1i1"], "r4k4r/11/11/11/11/11/11/11/11/R6RK2"),
+    ("en passant", "4k3/3p4/8/4P3/8/8/8/4K3", pychess.BLACK, ["d7d5", "e5d6"], "4k3/8/3P4/8/8/8/8/4K3"),
+    ("drops", "4k3/8/8/8/8/8/8/4K3", pychess.WHITE, ["N@e4", "P@d5", "e4d6"], "4k3/8/3N4/3p4/8/8/8/4K3"),
+    ("promotion", "4k3/P7/8/8/8/8/8/4K3", pychess.WHITE, ["a7a8q", "e8d7", "a8a7"], "8/Q2k4/8/8/8/8/8/4K3"),
+    ("promotion in place", "4k3/8/8/8/2P5/8/8/4K3", pychess.WHITE, ["c4c5+"], "4k3/8/8/2+P5/8/8/8/4K3"),
+    ("capture", "4k3/8/8/3q4/8/8/8/3QK3", pychess.WHITE, ["d1d5", "e8d8", "d5d8"], "3Q4/8/8/8/8/8/8/4K3"),
+]
+
+
+class BoardTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.static_path = pychess_svg.STATIC_PATH
+        pychess_svg.STATIC_PATH = STATIC_PATH
+        pychess_svg.scan_assets()
+
+    @classmethod
+    def tearDownClass(cls):
+        pychess_svg.STATIC_PATH = cls.static_path
+        for cache in (pychess_svg.SVG_PIECES, pychess_svg.SVG_PATH_PIECES, pychess_svg.SVG_PIECE_ELEMENTS,
+                      pychess_svg.PIECE_STATS, pychess_svg.ASSET_VERSIONS, pychess_svg.MISSING):
+            cache.clear()
+        pychess_svg.scan_assets()
+
+    def test_size(self):
+        board = pychess.Board("3qk4/9/9/9/9/9/9/9/9/3QK4", CSS)
+        self.assertEqual((board.rows, board.cols), (10, 9))
+        board = pychess.Board("10/10/10/10/10/10/10/10/10/4K5", CSS)
+        self.assertEqual((board.rows, board.cols), (10, 10))
+        self.assertEqual(board.piece_at(9, 4), pychess.Piece(pychess.KING, pychess.WHITE))
+
+    def test_limits(self):
+        pychess.Board("/".join(["26"] * 16), CSS)
+        for fen in ["99999999", "27", "26k", "k26", "p" * 27, "/".join(["8"] * 17)]:
+            with self.subTest(fen):
+                with self.assertRaises(ValueError):
+                    pychess.Board(fen, CSS)
+
+    def assertPosition(self, board, fen, turn):
+        expected = pychess.Board(fen, CSS)
+        expected.set_turn(turn)
+        self.assertEqual(board.pieces, expected.pieces)
+        self.assertEqual(board.turn, turn)
+        self.assertEqual(board.zobrist_hash(), board._compute_hash())
+        self.assertEqual(board.zobrist_hash(), expected.zobrist_hash())
+
+    def test_push_pop(self):
+        for name, fen, turn, moves, result in MOVES:
+            with self.subTest(name):
+                board = pychess.Board(fen, CSS)
+                board.set_turn(turn)
+                for uci in moves:
+                    board.push(pychess.Move.from_uci(uci))
+                    self.assertEqual(board.zobrist_hash(), board._compute_hash())
+                self.assertPosition(board, result, turn ^ (len(moves) % 2 == 1))
+
+                for uci in reversed(moves):
+                    self.assertEqual(board.pop().to_square, pychess.Move.from_uci(uci).to_square)
+                    self.assertEqual(board.zobrist_hash(), board._compute_hash())
+                self.assertPosition(board, fen, turn)
+                self.assertEqual(board.move_stack, [])
+
+    def test_set_turn(self):
+        board = pychess.Board("4k3/8/8/8/8/8/8/4K3 b", CSS)
+        self.assertEqual(board.turn, pychess.BLACK)
+        board.set_turn(pychess.WHITE)
+        self.assertEqual(board.zobrist_hash(), pychess.Board("4k3/8/8/8/8/8/8/4K3 w", CSS).zobrist_hash())
+        self.assertEqual(board.zobrist_hash(), board._compute_hash())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Checks that the SVG engines of pychess_svg produce equivalent documents,
+which draw the same as the golden documents in tests/golden. These were
+rendered by the original renderer, compact boards by the etree engine that
+introduced them.
+"""
+
+import json
+import os
+import unittest
+
+import pychess
+import pychess_svg
+from benchmark import canonical
+from drawing import drawing
+
+
+TESTS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+STATIC_PATH = os.path.join(TESTS_PATH, "static") + os.sep
+
+GOLDEN_PATH = os.path.join(TESTS_PATH, "golden")
+
+CSS = "test/test"
+
+FEN = "3qk3/4p3/8/8/8/8/4P3/3QK3"
+
+# (name, board fen, keyword arguments for pychess_svg.board)
+CASES = [
+    ("plain", FEN, {}),
+    ("compact", FEN, {
+        "compact": True,
+        "flipped": True,
+    }),
+    ("coordinates", FEN, {
+        "coordinates": "standard",
+        "rotate_opponent": True,
+    }),
+    ("arrows", FEN, {
+        "lastmove": "e7e5",
+        "check": "e1",
+        "arrows": ["Gd1h5", "Re8", "Bd8a5"],
+        "squares": ["a3", "c3"],
+    }),
+    ("svg background", FEN, {
+        "background_image": "pattern.svg",
+        "coordinates": "standard",
+    }),
+    ("png background", FEN, {
+        "background_image": "wood.png",
+    }),
+    ("large", "3qk4/4p4/9/9/9/9/9/9/4P4/3QK4", {
+        "coordinates": "standard",
+        "compact": True,
+    }),
+]
+
+
+def render(fen, kwargs, engine):
+    kwargs = dict(kwargs)
+    if "lastmove" in kwargs:
+        kwargs["lastmove"] = pychess.Move.from_uci(kwargs["lastmove"])
+    if "arrows" in kwargs:
+        kwargs["arrows"] = [pychess.Arrow.from_pgn(arrow) for arrow in kwargs["arrows"]]
+    return pychess_svg.board(CSS, pychess.Board(fen, CSS), engine=engine, **kwargs)
+
+
+class EngineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.static_path = pychess_svg.STATIC_PATH
+        pychess_svg.STATIC_PATH = STATIC_PATH
+        pychess_svg.scan_assets()
+
+        with open(os.path.join(TESTS_PATH, "..", "lichess-brown.json")) as f:
+            cls.colors = json.load(f)
+
+    @classmethod
+    def tearDownClass(cls):
+        pychess_svg.STATIC_PATH = cls.static_path
+        for cache in (pychess_svg.SVG_PIECES, pychess_svg.SVG_PATH_PIECES, pychess_svg.SVG_PIECE_ELEMENTS,
+                      pychess_svg.PIECE_STATS, pychess_svg.ASSET_VERSIONS, pychess_svg.MISSING):
+            cache.clear()
+        pychess_svg.scan_assets()
+
+    def test_board(self):
+        for name, fen, kwargs in CASES:
+            kwargs = dict(kwargs, colors=self.colors, width=360, height=360)
+            with self.subTest(name):
+                documents = {engine: render(fen, kwargs, engine) for engine in pychess_svg.ENGINES}
+                self.assertTrue('id="white-K-piece"' in documents["template"], "pieces not loaded")
+                with open(os.path.join(GOLDEN_PATH, name.replace(" ", "_") + ".svg")) as f:
+                    golden = drawing(f.read())
+                for engine, svg in documents.items():
+                    self.assertEqual(canonical(svg), canonical(documents["etree"]), engine)
+                    self.assertEqual(drawing(svg), golden, engine)
+
+    def test_sheet(self):
+        boards = [pychess.Board(FEN, CSS), pychess.Board("4k3/8/8/8/8/8/8/4K3", CSS), pychess.Board("4k4/9/9/9/9/9/9/9/9/4K4", CSS)]
+        for compact in (False, True):
+            with self.subTest(compact=compact):
+                documents = {engine: pychess_svg.sheet(CSS, boards, columns=2, gap=10, width=120, height=120, colors=self.colors,
+                                                       coordinates="standard", flipped=True, compact=compact, engine=engine)
+                             for engine in pychess_svg.ENGINES}
+                for engine, svg in documents.items():
+                    self.assertEqual(canonical(svg), canonical(documents["etree"]), engine)
+
+
+if __name__ == "__main__":
+    unittest.main()